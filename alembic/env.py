@@ -5,7 +5,7 @@ from sqlalchemy import create_engine
 from alembic import context
 from config.settings import settings
 from models.base import Base
-from models import user, sales_order, anomaly  # Import all models
+from models import user, sales_order, anomaly, sales_rollup  # Import all models
 
 config = context.config
 
@@ -0,0 +1,45 @@
+"""Compares per-request auth cost before and after the verified-token cache.
+
+Run with ``python -m benchmarks.auth_tokens``. Needs no Redis or database.
+The previous path's per-request info log is left out of both measurements.
+"""
+import timeit
+import jwt
+from services.auth_service import AuthService
+from utils.permissions import VALID_PERMISSIONS, has_permission, permission_mask
+
+REQUIRED = ["view_order"]
+
+
+def previous_path(auth_service: AuthService, token: str) -> bool:
+    """jwt.decode on every request, then a check that builds two sets."""
+    decoded = jwt.decode(
+        token,
+        auth_service.secret_key,
+        algorithms=[auth_service.algorithm],
+        issuer="NebuloViz",
+    )
+    return set(REQUIRED).issubset(set(decoded.get('permissions', [])))
+
+
+def main(number: int = 20_000):
+    auth_service = AuthService()
+    token = auth_service.create_token(1, "admin", VALID_PERMISSIONS)
+    required_mask = permission_mask(REQUIRED, strict=True)
+
+    def cached_path() -> bool:
+        return has_permission(auth_service.verify_token(token), required_mask)
+
+    assert previous_path(auth_service, token) and cached_path()
+    before = timeit.timeit(
+        lambda: previous_path(auth_service, token), number=number
+    ) / number
+    after = timeit.timeit(cached_path, number=number) / number
+    print(f"{'path':<36}{'us/request':>12}")
+    print(f"{'jwt.decode + set check':<36}{before * 1e6:>12.2f}")
+    print(f"{'verified-token cache + bitmask':<36}{after * 1e6:>12.2f}")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compares cache encode/decode cost of the legacy JSON path and the msgpack codec.
+
+Run with ``python -m benchmarks.cache_codec``. Needs no Redis or database.
+"""
+import timeit
+from datetime import datetime, timedelta
+import numpy as np
+import models.user  # noqa: F401  (registers User for the SalesOrder relationship)
+from models.sales_order import SalesOrder, SalesOrderLine
+from services.cache_codec import build_codec
+
+
+def sample_orders(count: int = 100, lines: int = 5):
+    start = datetime(2023, 1, 1)
+    return [
+        SalesOrder(
+            id=i,
+            customer_name=f"Customer {i}",
+            created_at=start + timedelta(minutes=i),
+            user_id=1,
+            items=[
+                SalesOrderLine(
+                    id=i * lines + j,
+                    sales_order_id=i,
+                    product_name=f"Product {j}",
+                    quantity=j + 1,
+                    price=9.99 * (j + 1),
+                )
+                for j in range(lines)
+            ],
+        )
+        for i in range(count)
+    ]
+
+
+def measure(codec, value, number: int):
+    encoded = codec.dumps(value)
+    encode = timeit.timeit(lambda: codec.dumps(value), number=number) / number
+    decode = timeit.timeit(lambda: codec.loads(encoded), number=number) / number
+    return encode, decode, len(encoded)
+
+
+def sample_totals(count: int = 100):
+    start = datetime(2023, 1, 1)
+    return [
+        {
+            "id": i,
+            "customer_name": f"Customer {i}",
+            "created_at": start + timedelta(minutes=i),
+            "total": 12.5 * i,
+            "line_count": 5,
+        }
+        for i in range(count)
+    ]
+
+
+def main(number: int = 200):
+    rng = np.random.default_rng(0)
+    payloads = {
+        "100 order total rows": sample_totals(),
+        "1000 floats (list)": rng.normal(size=1000).tolist(),
+        "float64[10000] array": rng.normal(size=10_000),
+        # The legacy path stores only each order's repr here, so it never round-trips
+        "100 orders x 5 lines": sample_orders(),
+    }
+    codecs = [build_codec("json"), build_codec("msgpack")]
+    print(
+        f"{'payload':<24}{'codec':<10}"
+        f"{'encode us':>12}{'decode us':>12}{'bytes':>10}"
+    )
+    for label, value in payloads.items():
+        for codec in codecs:
+            encode, decode, size = measure(codec, value, number)
+            print(
+                f"{label:<24}{codec.name:<10}"
+                f"{encode * 1e6:>12.1f}{decode * 1e6:>12.1f}{size:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measures request latency when a hot cache entry expires under concurrent load.
+
+Run with ``python -m benchmarks.cache_stampede``. Needs the Redis at
+``REDIS_URL``; the database query is simulated with a fixed delay.
+"""
+import asyncio
+import time
+import numpy as np
+from services.cache_service import CacheService
+from utils.redis_pool import close_redis, get_redis
+
+QUERY_SECONDS = 0.05
+
+
+class Loader:
+    """Stands in for a database query and counts how often it runs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def query(self, page: int):
+        self.calls += 1
+        await asyncio.sleep(QUERY_SECONDS)
+        return [{"id": page * 100 + i, "total": 12.5 * i} for i in range(100)]
+
+
+async def timed_wave(call, concurrency: int) -> np.ndarray:
+    async def one():
+        start = time.perf_counter()
+        await call()
+        return time.perf_counter() - start
+
+    return np.array(await asyncio.gather(*(one() for _ in range(concurrency))))
+
+
+def naive_cached(redis, codec, loader):
+    """The previous get-or-compute path: every concurrent miss queries the database."""
+
+    async def call():
+        key = "benchmark:naive:page=1"
+        value = await redis.get(key)
+        if value is not None:
+            return codec.loads(value)
+        result = await loader.query(1)
+        await redis.set(key, codec.dumps(result), expire=60)
+        return result
+
+    return call
+
+
+async def run(redis, concurrency: int):
+    results = {}
+    service = CacheService(redis=redis, l1_enabled=False)
+
+    loader = Loader()
+    await redis.delete("benchmark:naive:page=1")
+    naive = naive_cached(redis, service.codec, loader)
+    results["miss, no single-flight"] = (
+        await timed_wave(naive, concurrency), loader.calls
+    )
+
+    fresh_cache = service.cached(timeout=60, tags=["benchmark_fresh"], stale_ttl=0)
+    loader = Loader()
+    fresh = fresh_cache(loader.query)
+    await service.invalidate("benchmark_fresh")
+    await fresh(1)
+    results["steady-state hit"] = await timed_wave(lambda: fresh(1), concurrency), 0
+
+    loader = Loader()
+    fresh = fresh_cache(loader.query)
+    await service.invalidate("benchmark_fresh")
+    results["miss, single-flight"] = (
+        await timed_wave(lambda: fresh(1), concurrency), loader.calls
+    )
+
+    loader = Loader()
+    # timeout=0 leaves the entry expired as soon as it is written
+    stale_cache = service.cached(timeout=0, tags=["benchmark_stale"], stale_ttl=60)
+    stale = stale_cache(loader.query)
+    await service.invalidate("benchmark_stale")
+    await stale(2)
+    loader.calls = 0
+    latencies = await timed_wave(lambda: stale(2), concurrency)
+    # Let the background refresh finish before counting it
+    await asyncio.sleep(QUERY_SECONDS * 2)
+    results["expired, stale-while-revalidate"] = latencies, loader.calls
+    return results
+
+
+def main(concurrency: int = 200):
+    async def bench():
+        try:
+            return await run(await get_redis(), concurrency)
+        finally:
+            await close_redis()
+
+    results = asyncio.run(bench())
+    print(
+        f"{concurrency} concurrent requests, "
+        f"simulated query {QUERY_SECONDS * 1000:.0f} ms"
+    )
+    print(f"{'scenario':<34}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}")
+    for label, (latencies, calls) in results.items():
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{label:<34}{p50:>10.2f}{p99:>10.2f}{calls:>10}")
+
+
+if __name__ == "__main__":
+    main()
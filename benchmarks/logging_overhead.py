@@ -0,0 +1,79 @@
+"""Measures the logging cost a request pays on the event-loop thread.
+
+Run with ``python -m benchmarks.logging_overhead``. Needs no Redis or
+database; records are written to ``os.devnull``. Each request logs the
+three hot-path messages once. "caller" is the time spent in the logging
+calls; "drained" also includes waiting for the background thread to
+write everything that was queued.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from utils.logger import JsonLogger
+
+HOT_MESSAGES = [
+    ("JWT token verified", {"user_id": 42}),
+    ("Sales order retrieved", {"order_id": 1234}),
+    ("Retrieved sales orders", {"count": 10}),
+]
+
+
+class PreviousFormatter(logging.Formatter):
+    """json.dumps with a second utcnow() per record."""
+
+    def format(self, record):
+        return json.dumps({
+            "timestamp": datetime.utcnow().isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "extra": getattr(record, 'extra', {})
+        })
+
+
+def measure(logger: JsonLogger, requests: int, sampled: bool) -> tuple:
+    start = time.perf_counter()
+    for _ in range(requests):
+        for message, context in HOT_MESSAGES:
+            logger.info(message, sampled=sampled, **context)
+    caller = time.perf_counter() - start
+    logger.close()
+    drained = time.perf_counter() - start
+    return caller / requests, drained / requests
+
+
+def main(requests: int = 20_000):
+    with open(os.devnull, "w") as devnull:
+        previous = JsonLogger("bench_previous", queued=False, stream=devnull)
+        previous.logger.handlers[0].setFormatter(PreviousFormatter())
+        variants = [
+            ("sync json.dumps (previous)", previous, False),
+            (
+                "sync orjson",
+                JsonLogger("bench_sync", queued=False, stream=devnull),
+                False,
+            ),
+            (
+                "queued orjson",
+                JsonLogger("bench_queued", queued=True, stream=devnull),
+                False,
+            ),
+            (
+                "queued orjson, sampled",
+                JsonLogger("bench_sampled", queued=True, stream=devnull),
+                True,
+            ),
+        ]
+        print(f"{'mode':<30}{'caller us/req':>15}{'drained us/req':>16}")
+        for name, logger, sampled in variants:
+            logger.logger.propagate = False
+            caller, drained = measure(logger, requests, sampled)
+            print(f"{name:<30}{caller * 1e6:>15.2f}{drained * 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
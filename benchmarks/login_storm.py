@@ -0,0 +1,75 @@
+"""Measures latency of a light request while a burst of logins runs bcrypt.
+
+Run with ``python -m benchmarks.login_storm``. Needs no Redis or database.
+"""
+import asyncio
+import time
+import bcrypt
+import numpy as np
+from services.security.security import (
+    PasswordHasher, PasswordQueueFull, verify_password,
+)
+
+PROBE_INTERVAL = 0.005
+PASSWORD = "securepassword"
+
+
+async def probe(stop: asyncio.Event) -> np.ndarray:
+    """Stands in for a cheap endpoint: how late does the loop get back to it?"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        latencies.append(time.perf_counter() - start - PROBE_INTERVAL)
+    return np.array(latencies)
+
+
+async def storm(login, logins: int):
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop))
+    await asyncio.sleep(0.05)
+    refused = 0
+
+    async def one():
+        nonlocal refused
+        try:
+            await login()
+        except PasswordQueueFull:
+            refused += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return await probe_task, elapsed, refused
+
+
+def main(logins: int = 40, rounds: int = 10, workers: int = 2):
+    salt = bcrypt.gensalt(rounds)
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), salt).decode('utf-8')
+
+    async def inline_login():
+        # The previous path: bcrypt on the event loop
+        verify_password(PASSWORD, hashed)
+
+    hasher = PasswordHasher(workers=workers, max_pending=logins)
+    bounded = PasswordHasher(workers=workers, max_pending=logins // 2)
+    scenarios = {
+        "bcrypt on the event loop": inline_login,
+        f"executor ({workers} threads)": lambda: hasher.verify(PASSWORD, hashed),
+        f"executor, queue max {logins // 2}": lambda: bounded.verify(PASSWORD, hashed),
+    }
+    print(f"{logins} concurrent logins, bcrypt cost {rounds}")
+    print(
+        f"{'scenario':<30}{'probe p50 ms':>14}{'probe p99 ms':>14}"
+        f"{'logins/s':>10}{'refused':>9}"
+    )
+    for label, login in scenarios.items():
+        latencies, elapsed, refused = asyncio.run(storm(login, logins))
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        rate = (logins - refused) / elapsed
+        print(f"{label:<30}{p50:>14.2f}{p99:>14.2f}{rate:>10.1f}{refused:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 
 import os
 from pydantic import BaseSettings, Field
-from typing import List
+from typing import List, Optional
 
 
 class BaseSettingsConfig(BaseSettings):
@@ -9,22 +9,78 @@ class BaseSettingsConfig(BaseSettings):
 
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
     REDIS_URL: str = Field(..., env="REDIS_URL")
+    REDIS_POOL_MIN_SIZE: int = 1  # Shared by the cache and the rate limiter
+    REDIS_POOL_MAX_SIZE: int = 20
+    REDIS_CONNECT_TIMEOUT: float = 5  # Seconds
     JWT_SECRET_KEY: str = Field(..., env="JWT_SECRET_KEY")
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_TOKEN_CACHE_SIZE: int = 4096  # Verified tokens kept in memory per worker
     PASSWORD_HASH_SALT: str = Field(..., env="PASSWORD_HASH_SALT")
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt threads per worker process
+    # Logins running or queued before more are refused
+    PASSWORD_HASH_QUEUE_MAX: int = 64
     EMAIL_SMTP_SERVER: str = Field(..., env="EMAIL_SMTP_SERVER")
     EMAIL_SMTP_PORT: int = Field(..., env="EMAIL_SMTP_PORT")
     EMAIL_USERNAME: str = Field(..., env="EMAIL_USERNAME")
     EMAIL_PASSWORD: str = Field(..., env="EMAIL_PASSWORD")
+    EMAIL_USE_TLS: bool = True
     NOTIFICATION_RECIPIENTS: List[str] = Field(..., env="NOTIFICATION_RECIPIENTS")
+    ALERT_DIGEST_WINDOW_MS: int = 5000  # Alerts within this window share one email
+    ALERT_QUEUE_MAX: int = 1000  # Pending alerts before new ones are dropped
     LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
+    # Format and write log records on a background thread
+    LOG_QUEUE_ENABLED: bool = True
+    # Seconds between records of the same sampled message (0 disables sampling)
+    LOG_SAMPLE_INTERVAL: float = 1.0
+    SERVER_TIMING_ENABLED: bool = False  # Send Server-Timing to every client
+    # Requests sending this in X-Profile are profiled
+    PROFILING_TOKEN: Optional[str] = None
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of other requests profiled
+    PROFILING_INTERVAL_MS: float = 5  # Stack sampling interval
+    PROFILING_DIR: str = "./profiles/"
+    PROFILING_MAX_FILES: int = 100  # Oldest profiles are deleted beyond this
     SUPPORTED_LANGUAGES: List[str] = ["en", "es", "fr"]
     DEFAULT_LANGUAGE: str = "en"
     RATE_LIMIT: str = "100/minute"  # For rate limiting
     CACHE_NAMESPACE: str = Field("nebuloviz_dev", env="CACHE_NAMESPACE")
+    CACHE_SERIALIZER: str = "msgpack"  # "msgpack" (typed binary) or "json" (legacy)
+    CACHE_L1_ENABLED: bool = False  # In-process LRU in front of Redis
+    CACHE_L1_MAX_ENTRIES: int = 1024
+    CACHE_L1_TTL: int = 5  # Seconds; bounds staleness if an invalidation is missed
+    # Seconds a tag generation is kept; must outlive cached() timeouts
+    CACHE_TAG_TTL: int = 86400
+    # Seconds an expired entry is served while it is refreshed
+    CACHE_STALE_TTL: int = 30
+    # Redis lock so one worker recomputes a missing entry
+    CACHE_LOCK_ENABLED: bool = False
+    CACHE_LOCK_TIMEOUT_MS: int = 5000
+    CACHE_LOCK_POLL_MS: int = 25
     KAFKA_BOOTSTRAP_SERVERS: str = Field(..., env="KAFKA_BOOTSTRAP_SERVERS")
+    KAFKA_BATCH_SIZE: int = 500  # Max messages pulled per consume() call
+    KAFKA_BATCH_TIMEOUT_MS: int = 100  # Max wait for a batch to fill
     AI_MODELS_PATH: str = "./models/"
+    AI_MODEL_RELOAD_SECONDS: float = 5  # How often workers check for new model versions
+    AI_FORECAST_REFRESH_SECONDS: float = 60  # How often workers re-read the rollup
+    AI_MODEL_KEEP_VERSIONS: int = 5  # Versions kept per model for rollback
+    AI_PROCESS_WORKERS: int = 2  # Processes for model fitting and batch inference
+    AI_TRAINING_JOB_TIMEOUT: int = 3600  # Seconds before a stuck job stops blocking
+    AI_TRAINING_JOB_TTL: int = 86400  # Seconds a finished job's status stays readable
+    AI_FORECAST_CACHE_SIZE: int = 256  # Forecast series cached per worker
+    AI_FORECAST_CACHE_TTL: int = 3600  # Seconds a cached forecast series is kept
+    AI_FORECAST_MAX_POINTS: int = 3660  # Points one forecast request may compute
+    AI_FORECAST_MAX_SERIES: int = 20  # Ranges one forecast request may ask for
+    SALES_TREND_MAX_DAYS: int = 3660  # Longest span /sales/trend returns
+    BULK_INGEST_CHUNK_SIZE: int = 1000  # Orders per bulk-ingestion transaction
+    BULK_INGEST_MAX_ERRORS: int = 1000  # Per-row errors echoed back in the response
+    ANOMALY_THRESHOLD_SIGMA: float = 2.0  # Standard deviations above the running mean
+    ANOMALY_STATS_DECAY: Optional[float] = None  # Exponential decay factor in (0, 1]
+    ANOMALY_STATS_WINDOW: Optional[int] = None  # Sliding window size in values
+    ANOMALY_FLUSH_SIZE: int = 200  # Max anomalies per multi-row INSERT
+    ANOMALY_FLUSH_INTERVAL_MS: int = 500  # Max time an anomaly waits in the buffer
+    ANOMALY_SINK_MAX_QUEUE: int = 10000  # Buffered anomalies before producers wait
+    ANOMALY_FLUSH_RETRIES: int = 3  # Retries before a failed flush drops its rows
+    ANOMALY_FLUSH_BACKOFF_MS: int = 100  # First retry delay, doubled for each retry
     ENVIRONMENT: str = Field("development", env="ENVIRONMENT")
 
     class Config:
@@ -11,6 +11,9 @@ const server = setupServer(
   }),
   rest.get('/api/v1/sales-data/', (req, res, ctx) => {
     return res(ctx.json({ data: [] }));
+  }),
+  rest.get('/api/v1/orders/', (req, res, ctx) => {
+    return res(ctx.json({ orders: [], next_cursor: null }));
   })
 );
 
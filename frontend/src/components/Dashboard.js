@@ -79,7 +79,7 @@ function Dashboard() {
         <SalesHeatmap data={salesData} />
       </Grid>
       <Grid item xs={12}>
-        <SalesDataTable data={salesData} />
+        <SalesDataTable />
       </Grid>
     </Grid>
   );
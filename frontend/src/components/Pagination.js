@@ -1,16 +1,21 @@
-
 import React from 'react';
-import { Pagination } from '@material-ui/lab';
+import { Button, Typography } from '@material-ui/core';
 
-function DataTablePagination({ page, count, onChange }) {
+// Cursor-based pagination: the server returns an opaque next_cursor, so only
+// previous/next navigation is possible (previous pages are kept as a cursor stack).
+function DataTablePagination({ page, hasPrevious, hasNext, onPrevious, onNext }) {
   return (
-    <Pagination
-      page={page}
-      count={count}
-      onChange={(event, value) => onChange(value)}
-      variant="outlined"
-      shape="rounded"
-    />
+    <div style={{ display: 'flex', alignItems: 'center', justifyContent: 'flex-end', padding: 8 }}>
+      <Button variant="outlined" size="small" disabled={!hasPrevious} onClick={onPrevious}>
+        Previous
+      </Button>
+      <Typography variant="body2" style={{ margin: '0 12px' }}>
+        Page {page}
+      </Typography>
+      <Button variant="outlined" size="small" disabled={!hasNext} onClick={onNext}>
+        Next
+      </Button>
+    </div>
   );
 }
 
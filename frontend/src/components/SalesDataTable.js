@@ -1,4 +1,5 @@
-import React from 'react';
+import React, { useState } from 'react';
+import { useQuery } from 'react-query';
 import {
   Table,
   TableBody,
@@ -8,9 +9,34 @@ import {
   Paper,
   TableContainer,
 } from '@material-ui/core';
+import { apiClient } from '../services/apiClient';
+import LoadingSpinner from './LoadingSpinner';
 import Pagination from './Pagination';
 
-function SalesDataTable({ data }) {
+const PAGE_SIZE = 20;
+
+function SalesDataTable() {
+  // cursors[i] is the cursor that fetches page i + 1; the first page has no cursor
+  const [cursors, setCursors] = useState([null]);
+  const cursor = cursors[cursors.length - 1];
+
+  const { data, isLoading, error } = useQuery(
+    ['salesOrders', cursor],
+    async () => {
+      const response = await apiClient.get('/orders/', {
+        params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      });
+      return response.data;
+    },
+    { keepPreviousData: true }
+  );
+
+  if (isLoading) return <LoadingSpinner />;
+  if (error) return <p>Error loading sales orders.</p>;
+
+  const handleNext = () => setCursors([...cursors, data.next_cursor]);
+  const handlePrevious = () => setCursors(cursors.slice(0, -1));
+
   return (
     <TableContainer component={Paper}>
       <Table aria-label="sales data table">
@@ -34,9 +60,11 @@ function SalesDataTable({ data }) {
         </TableBody>
       </Table>
       <Pagination
-        page={data.current_page}
-        count={data.total_pages}
-        onChange={data.onPageChange}
+        page={cursors.length}
+        hasPrevious={cursors.length > 1}
+        hasNext={Boolean(data.next_cursor)}
+        onPrevious={handlePrevious}
+        onNext={handleNext}
       />
     </TableContainer>
   );
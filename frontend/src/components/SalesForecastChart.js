@@ -1,20 +1,27 @@
-
 import React, { useState } from 'react';
 import { Line } from 'react-chartjs-2';
 import { useQuery } from 'react-query';
 import { apiClient } from '../services/apiClient';
-import { TextField, Button } from '@material-ui/core';
+import { TextField, Button, MenuItem } from '@material-ui/core';
 import LoadingSpinner from './LoadingSpinner';
 
+const FREQUENCIES = [
+  { value: 'D', label: 'Daily' },
+  { value: 'W', label: 'Weekly' },
+  { value: 'M', label: 'Monthly' },
+];
+
 function SalesForecastChart() {
-  const [futureDates, setFutureDates] = useState(['2023-12-01', '2023-12-02']);
+  const [start, setStart] = useState('2023-12-01');
+  const [end, setEnd] = useState('2023-12-31');
+  const [freq, setFreq] = useState('D');
   const { data, isLoading, error, refetch } = useQuery(
-    ['salesForecast', futureDates],
+    ['salesForecast', start, end, freq],
     async () => {
-      const response = await apiClient.get('/ai/predict-sales/', {
-        params: { future_dates: futureDates },
+      const response = await apiClient.get('/ai/forecast/', {
+        params: { start, end, freq },
       });
-      return response.data;
+      return response.data.series[0];
     },
     {
       enabled: false, // Disabled by default, manual refetch
@@ -30,7 +37,7 @@ function SalesForecastChart() {
 
   const chartData = data
     ? {
-        labels: futureDates,
+        labels: data.dates,
         datasets: [
           {
             label: 'Predicted Sales',
@@ -46,12 +53,36 @@ function SalesForecastChart() {
   return (
     <div>
       <TextField
-        label="Future Dates (comma-separated)"
-        value={futureDates.join(', ')}
-        onChange={(e) => setFutureDates(e.target.value.split(',').map((date) => date.trim()))}
-        fullWidth
+        label="Start"
+        type="date"
+        value={start}
+        onChange={(e) => setStart(e.target.value)}
+        InputLabelProps={{ shrink: true }}
         variant="outlined"
       />
+      <TextField
+        label="End"
+        type="date"
+        value={end}
+        onChange={(e) => setEnd(e.target.value)}
+        InputLabelProps={{ shrink: true }}
+        variant="outlined"
+        style={{ marginLeft: 10 }}
+      />
+      <TextField
+        select
+        label="Frequency"
+        value={freq}
+        onChange={(e) => setFreq(e.target.value)}
+        variant="outlined"
+        style={{ marginLeft: 10, minWidth: 120 }}
+      >
+        {FREQUENCIES.map((option) => (
+          <MenuItem key={option.value} value={option.value}>
+            {option.label}
+          </MenuItem>
+        ))}
+      </TextField>
       <Button variant="contained" color="primary" onClick={handlePredict} style={{ marginTop: 10 }}>
         Predict Sales
       </Button>
@@ -1,6 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from services.api_service import app as api_app
 from config.settings import settings
+from utils.metrics import render_metrics
 
 app = FastAPI(
     title="NebuloViz",
@@ -11,4 +12,16 @@ app = FastAPI(
 # Include the API router
 app.mount("/api/v1", api_app)
 
+# Mounted apps do not receive lifespan events, so forward them
+app.router.on_startup.extend(api_app.router.on_startup)
+app.router.on_shutdown.extend(api_app.router.on_shutdown)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint, aggregated across workers in multiprocess mode."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # Add any additional middleware, event handlers, etc.
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, Float, Date, String, SmallInteger
+from models.base import Base
+
+
+class DailySalesRollup(Base):
+    """Per-day sales totals maintained incrementally as orders are written."""
+
+    __tablename__ = "daily_sales_rollup"
+
+    day = Column(Date, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    order_count = Column(Integer, nullable=False, default=0)
+    line_count = Column(Integer, nullable=False, default=0)
+
+
+class WeeklySalesHeatmapCell(Base):
+    """One weekday x hour cell of a product's sales for a given week."""
+
+    __tablename__ = "weekly_sales_heatmap"
+
+    week_start = Column(Date, primary_key=True)  # Monday of the ISO week
+    product_name = Column(String, primary_key=True)
+    weekday = Column(SmallInteger, primary_key=True)  # 0 = Monday
+    hour = Column(SmallInteger, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    line_count = Column(Integer, nullable=False, default=0)
@@ -1,28 +1,123 @@
+import numpy as np
 import pandas as pd
 import joblib
-from sklearn.cluster import KMeans
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
-import shap
-import dask.dataframe as dd
 from utils.logger import app_logger
+from utils.metrics import AI_INFERENCE_DURATION, AI_TRAINING_DURATION
 from services.data_service import DataService
-from typing import List
+from services.ai_workers import fit_sales_stats, fit_segmentation, predict_segments
+from services.cache_service import LocalCache
+from services.model_registry import ModelRegistry
+from utils.running_stats import RunningLinearRegression
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+import asyncio
+import multiprocessing
 import os
+import time
 from config.settings import settings
 
+SALES_FORECAST = "sales_forecast"
+CUSTOMER_SEGMENTATION = "customer_segmentation"
+
+# datetime64[D] counts days from 1970-01-01, whose proleptic ordinal is 719163
+EPOCH_ORDINAL = 719163
+
+# Inputs of the sales forecast model, in column order
+SALES_FEATURES = ["date_ordinal"]
+
+# Forecast frequencies: daily, weekly from the start date, and the first of each month
+FORECAST_FREQUENCIES = ("D", "W", "M")
+
+
+class ModelNotTrainedError(ValueError):
+    """Raised when inference is requested before a model version exists."""
+
+
+def to_ordinals(dates) -> np.ndarray:
+    """Converts dates to proleptic Gregorian ordinals without per-element calls."""
+    days = pd.to_datetime(np.asarray(dates)).values.astype('datetime64[D]')
+    return days.astype(np.int64) + EPOCH_ORDINAL
+
+
+def daily_order_arrays(rows: Sequence[Tuple[date, float, int]]):
+    """Splits daily rollup rows into (date ordinal, total, order count) arrays."""
+    days, totals, counts = zip(*rows)
+    return (
+        to_ordinals(days),
+        np.asarray(totals, dtype=float),
+        np.asarray(counts, dtype=float),
+    )
+
+
+def forecast_points(start: date, end: date, freq: str = "D") -> int:
+    """Counts the points ``forecast_dates`` would return, without building them."""
+    if freq not in FORECAST_FREQUENCIES:
+        raise ValueError(f"Unknown forecast frequency: {freq}")
+    if start > end:
+        raise ValueError("start must not be after end")
+    if freq == "M":
+        first_month = start.year * 12 + start.month - 1 + (start.day > 1)
+        return max(end.year * 12 + end.month - 1 - first_month + 1, 0)
+    return (end - start).days // (7 if freq == "W" else 1) + 1
+
+
+def forecast_dates(start: date, end: date, freq: str = "D") -> np.ndarray:
+    """Returns the datetime64[D] points of [start, end] at ``freq`` as one arange."""
+    forecast_points(start, end, freq)
+    first, last = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    if freq == "M":
+        months = np.arange(
+            first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1
+        )
+        days = months.astype('datetime64[D]')
+        return days[days >= first]
+    return np.arange(first, last + 1, 7 if freq == "W" else 1)
+
 
 class AIInsights:
-    """Service for AI-powered insights with explainability."""
+    """Service for AI-powered insights with explainability.
+
+    Forecast explanations are computed in closed form from the statistics
+    stored in the model artifact, so they are available in every worker
+    that has the model loaded, whatever version it is on.
+
+    Trained models are published to the ``ModelRegistry``. Every worker
+    loads the current versions memory-mapped and, once ``start`` has been
+    called, polls for newer ones and swaps them in between requests.
 
-    def __init__(self):
+    Orders recorded through ``record_sales_order`` only update this
+    worker's forecast statistics. The watcher also rebuilds them from the
+    daily sales rollup, which is written with every order, at least every
+    ``AI_FORECAST_REFRESH_SECONDS``, so all workers converge on the same
+    statistics and no order is lost to a restart or a model reload.
+
+    Model fitting and segmentation run in a process pool so they never
+    block the event loop; inference never trains a missing model.
+    """
+
+    def __init__(self, registry: Optional[ModelRegistry] = None):
         self.data_service = DataService()
+        self.registry = registry or ModelRegistry()
+        self.model_versions: Dict[str, Optional[str]] = {
+            SALES_FORECAST: None,
+            CUSTOMER_SEGMENTATION: None,
+        }
+        self.sales_model = None
+        self.sales_stats = RunningLinearRegression()
+        self.kmeans_model = None
         self.scaler = StandardScaler()
-        self.sales_model_path = os.path.join(settings.AI_MODELS_PATH, 'sales_model.pkl')
-        self.kmeans_model_path = os.path.join(settings.AI_MODELS_PATH, 'kmeans_model.pkl')
-        self.sales_model = self.load_model(self.sales_model_path)
-        self.kmeans_model = self.load_model(self.kmeans_model_path)
-        self.explainer = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.forecast_cache = LocalCache(
+            settings.AI_FORECAST_CACHE_SIZE, settings.AI_FORECAST_CACHE_TTL
+        )
+        for name, (version, artifact, metadata) in self.load_new_versions().items():
+            self.install_model(name, version, artifact)
+        if self.model_versions[SALES_FORECAST] is None:
+            self.load_legacy_models()
 
     def load_model(self, model_path):
         """Loads a persisted model if available."""
@@ -30,83 +125,331 @@ class AIInsights:
             return joblib.load(model_path)
         return None
 
-    def save_model(self, model, model_path):
-        """Saves a model to disk."""
-        joblib.dump(model, model_path)
-
-    def train_sales_forecast_model(self):
-        """Trains and saves a linear regression model for sales forecasting."""
-        orders = self.data_service.get_all_sales_orders(limit=1000)
-        df = pd.DataFrame([{
-            "date": order.created_at,
-            "total": sum([item.quantity * item.price for item in order.items])
-        } for order in orders])
-        if df.empty:
+    def load_legacy_models(self):
+        """Loads models saved before the registry existed, until they are retrained."""
+        self.sales_stats = self.load_model(
+            os.path.join(settings.AI_MODELS_PATH, 'sales_forecast_stats.pkl')
+        ) or self.sales_stats
+        self.sales_model = self.load_model(
+            os.path.join(settings.AI_MODELS_PATH, 'sales_model.pkl')
+        )
+        if self.model_versions[CUSTOMER_SEGMENTATION] is None:
+            self.kmeans_model = self.load_model(
+                os.path.join(settings.AI_MODELS_PATH, 'kmeans_model.pkl')
+            )
+            self.scaler = self.load_model(
+                os.path.join(settings.AI_MODELS_PATH, 'segment_scaler.pkl')
+            ) or self.scaler
+
+    def load_new_versions(self) -> Dict[str, tuple]:
+        """Loads versions newer than the installed ones.
+
+        Reads artifacts from disk, so run it off the event loop.
+        """
+        loaded = {}
+        for name, installed in self.model_versions.items():
+            version = self.registry.current_version(name)
+            if version is None or version == installed:
+                continue
+            # Forecast statistics are updated in place, so they are mapped copy-on-write
+            mmap_mode = "c" if name == SALES_FORECAST else "r"
+            artifact, metadata = self.registry.load(name, version, mmap_mode=mmap_mode)
+            loaded[name] = (version, artifact, metadata)
+        return loaded
+
+    def install_model(self, name: str, version: str, artifact: Any):
+        """Swaps in a loaded model version.
+
+        There is no await, so requests see either the old or the new version whole.
+        """
+        if name == SALES_FORECAST:
+            self.sales_stats = artifact
+            self.sales_model = self.build_sales_model() if artifact.count >= 2 else None
+        elif name == CUSTOMER_SEGMENTATION:
+            self.kmeans_model = artifact["kmeans"]
+            self.scaler = artifact["scaler"]
+        self.model_versions[name] = version
+        app_logger.info("Model version installed", model=name, version=version)
+
+    async def reload_models(self):
+        """Installs any versions published since the last check."""
+        loop = asyncio.get_running_loop()
+        loaded = await loop.run_in_executor(None, self.load_new_versions)
+        for name, (version, artifact, metadata) in loaded.items():
+            self.install_model(name, version, artifact)
+
+    async def refresh_sales_stats(self):
+        """Rebuilds the forecast statistics from the daily sales rollup.
+
+        Replaces the statistics of the installed version and any orders this
+        worker folded in since with the orders every worker has committed.
+        """
+        rows = await self.data_service.get_daily_order_totals()
+        if not rows:
+            return
+        stats = RunningLinearRegression.from_groups(*daily_order_arrays(rows))
+        self.sales_stats = stats
+        self.sales_model = self.build_sales_model() if stats.count >= 2 else None
+        # The order count alone may repeat, so cached series keyed by it are dropped
+        self.forecast_cache.clear()
+
+    async def _watch_models(self):
+        last_refresh = None
+        while True:
+            installed = self.model_versions[SALES_FORECAST]
+            try:
+                await self.reload_models()
+            except Exception as e:
+                app_logger.error("Failed to reload models", error=str(e))
+            # A newly installed version carries the statistics it was trained on
+            due = (
+                last_refresh is None
+                or installed != self.model_versions[SALES_FORECAST]
+                or time.monotonic() - last_refresh
+                >= settings.AI_FORECAST_REFRESH_SECONDS
+            )
+            if due:
+                try:
+                    await self.refresh_sales_stats()
+                    last_refresh = time.monotonic()
+                except Exception as e:
+                    app_logger.error(
+                        "Failed to refresh forecast statistics", error=str(e)
+                    )
+            await asyncio.sleep(settings.AI_MODEL_RELOAD_SECONDS)
+
+    async def run_in_pool(self, func, *args):
+        """Runs CPU-bound model work in the AI process pool."""
+        if self._pool is None:
+            # Spawned, not forked: the API process has a running loop and threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.AI_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    async def publish_model(self, name: str, artifact: Any, metadata: Dict) -> str:
+        """Publishes a new version off the loop and installs it in this worker."""
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(
+            None, self.registry.publish, name, artifact, metadata
+        )
+        self.install_model(name, version, artifact)
+        return version
+
+    def start(self):
+        """Starts polling the registry for new model versions."""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch_models())
+
+    async def close(self):
+        """Stops polling the registry and shuts down the process pool."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def build_sales_model(self) -> LinearRegression:
+        """Builds a fitted LinearRegression from the running sufficient statistics."""
+        coef, intercept = self.sales_stats.coefficients()
+        model = LinearRegression()
+        model.coef_ = coef
+        model.intercept_ = intercept
+        model.n_features_in_ = 1
+        model.feature_names_in_ = np.array(['date_ordinal'], dtype=object)
+        return model
+
+    async def train_sales_forecast_model(self) -> Optional[str]:
+        """Rebuilds the forecast statistics from the sales rollup and publishes them."""
+        rows = await self.data_service.get_daily_order_totals()
+        if sum(count for _, _, count in rows) < 2:
             app_logger.warning("No data available for training sales forecast model")
+            return None
+        with AI_TRAINING_DURATION.labels(SALES_FORECAST).time():
+            stats = await self.run_in_pool(fit_sales_stats, *daily_order_arrays(rows))
+            coef, intercept = stats.coefficients()
+            version = await self.publish_model(SALES_FORECAST, stats, {
+                "orders": stats.count,
+                "features": SALES_FEATURES,
+                "coef": coef.tolist(),
+                "intercept": intercept,
+                "base_value": stats.mean_y,
+                "background_mean": stats.mean_x.tolist(),
+            })
+        app_logger.info(
+            "Sales forecast model trained and saved",
+            orders=stats.count,
+            version=version,
+        )
+        return version
+
+    def record_sales_order(self, created_at: datetime, total: float):
+        """Folds a new order into this worker's forecast statistics in O(1).
+
+        Other workers see the order at their next ``refresh_sales_stats``.
+        """
+        self.sales_stats.update([created_at.toordinal()], total)
+        if self.sales_stats.count >= 2:
+            self.sales_model = self.build_sales_model()
+
+    def record_sales_orders(self, created_ats: List[datetime], totals: List[float]):
+        """Folds a batch of orders into this worker's statistics in one merge."""
+        if not created_ats:
             return
-        df.sort_values('date', inplace=True)
-        df['date_ordinal'] = pd.to_datetime(df['date']).map(pd.Timestamp.toordinal)
-        X = df[['date_ordinal']]
-        y = df['total']
-        self.sales_model = LinearRegression()
-        self.sales_model.fit(X, y)
-        self.save_model(self.sales_model, self.sales_model_path)
-        self.explainer = shap.LinearExplainer(self.sales_model, X)
-        app_logger.info("Sales forecast model trained and saved")
+        self.sales_stats.update_batch(to_ordinals(created_ats), totals)
+        if self.sales_stats.count >= 2:
+            self.sales_model = self.build_sales_model()
 
+    @AI_INFERENCE_DURATION.labels("predict_sales").time()
     def predict_sales(self, future_dates: List[str]) -> List[float]:
         """Predicts future sales based on the trained model."""
         if not self.sales_model:
-            self.train_sales_forecast_model()
-        date_ordinal = pd.to_datetime(future_dates).map(pd.Timestamp.toordinal)
-        X_future = pd.DataFrame({'date_ordinal': date_ordinal})
+            if self.sales_stats.count < 2:
+                raise ModelNotTrainedError("Sales forecast model has not been trained")
+            self.sales_model = self.build_sales_model()
+        X_future = pd.DataFrame({'date_ordinal': to_ordinals(future_dates)})
         predictions = self.sales_model.predict(X_future)
-        return predictions.tolist()
-
-    def explain_predictions(self, future_dates: List[str]):
-        """Provides explanations for the predictions."""
-        date_ordinal = pd.to_datetime(future_dates).map(pd.Timestamp.toordinal)
-        X_future = pd.DataFrame({'date_ordinal': date_ordinal})
-        shap_values = self.explainer.shap_values(X_future)
-        return shap_values
-
-    def train_customer_segmentation_model(self):
-        """Trains and saves a KMeans clustering model for customer segmentation."""
-        orders = self.data_service.get_all_sales_orders(limit=10000)
-        df = dd.from_pandas(pd.DataFrame([{
-            "customer_name": order.customer_name,
-            "total": sum([item.quantity * item.price for item in order.items]),
-            "order_count": len(order.items)
-        } for order in orders]), npartitions=4)
-        df_grouped = df.groupby('customer_name').agg({
-            'total': 'sum',
-            'order_count': 'sum'
-        }).compute().reset_index()
+        return np.asarray(predictions, dtype=float).tolist()
+
+    @property
+    def forecast_revision(self) -> str:
+        """Identifies the forecast state: installed version plus orders added since."""
+        version = self.model_versions[SALES_FORECAST] or 'legacy'
+        return f"{version}+{self.sales_stats.count}"
+
+    def _range_series(
+        self, kind: str, ranges: Sequence[Tuple[date, date, str]], evaluate
+    ) -> Dict[str, Any]:
+        """Evaluates ``evaluate`` over (start, end, freq) ranges, caching each series.
+
+        Ranges missing from the forecast cache are evaluated together in one
+        vectorized pass over their concatenated ordinals. ``evaluate`` maps
+        an (n, features) array to named per-point arrays; two-dimensional
+        ones are returned per feature. Entries are keyed by
+        ``forecast_revision``, so they are reused until a new version is
+        installed or another order is recorded.
+        """
+        if self.sales_stats.count < 2:
+            raise ModelNotTrainedError("Sales forecast model has not been trained")
+        if len(ranges) > settings.AI_FORECAST_MAX_SERIES:
+            raise ValueError(
+                f"At most {settings.AI_FORECAST_MAX_SERIES} series per forecast"
+            )
+        # Read once so a reload or recorded order mid-call cannot mix model states
+        revision = self.forecast_revision
+        keys = [
+            f"{kind}:{revision}:{start}:{end}:{freq}" for start, end, freq in ranges
+        ]
+        series: List[Optional[Dict]] = [self.forecast_cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(series) if entry is None]
+        if missing:
+            # Counted before any array is built, so oversized ranges cost nothing
+            points = sum(forecast_points(*ranges[i]) for i in missing)
+            if points > settings.AI_FORECAST_MAX_POINTS:
+                raise ValueError(
+                    f"Forecast of {points} points exceeds the limit of "
+                    f"{settings.AI_FORECAST_MAX_POINTS}"
+                )
+            dates = [forecast_dates(*ranges[i]) for i in missing]
+            bounds = np.cumsum([0] + [len(days) for days in dates])
+            ordinals = np.concatenate(dates).astype(np.int64) + EPOCH_ORDINAL
+            values = evaluate(ordinals.reshape(-1, 1).astype(float))
+            for i, days, lo, hi in zip(missing, dates, bounds[:-1], bounds[1:]):
+                start, end, freq = ranges[i]
+                entry = {"start": str(start), "end": str(end), "freq": freq}
+                entry["dates"] = np.datetime_as_string(days).tolist()
+                for field, array in values.items():
+                    if array.ndim == 2:
+                        columns = array[lo:hi].T.tolist()
+                        entry[field] = dict(zip(SALES_FEATURES, columns))
+                    else:
+                        entry[field] = array[lo:hi].tolist()
+                series[i] = entry
+                self.forecast_cache.set(keys[i], entry, self.forecast_cache.ttl)
+        return {"model_version": revision, "series": series}
+
+    @AI_INFERENCE_DURATION.labels("forecast").time()
+    def forecast(self, ranges: Sequence[Tuple[date, date, str]]) -> Dict[str, Any]:
+        """Forecasts sales over one or more (start, end, freq) ranges."""
+        def evaluate(X: np.ndarray) -> Dict[str, np.ndarray]:
+            coef, intercept = self.sales_stats.coefficients()
+            return {"predictions": X @ coef + intercept}
+
+        return self._range_series("forecast", ranges, evaluate)
+
+    @AI_INFERENCE_DURATION.labels("explain").time()
+    def explain(self, ranges: Sequence[Tuple[date, date, str]]) -> Dict[str, Any]:
+        """Forecasts sales over (start, end, freq) ranges with feature contributions.
+
+        Each prediction equals ``base_value`` plus its contributions. The cost
+        depends only on the number of points, never on the training set size.
+        """
+        def evaluate(X: np.ndarray) -> Dict[str, np.ndarray]:
+            base_value, contributions = self.sales_stats.contributions(X)
+            return {
+                "predictions": base_value + contributions.sum(axis=1),
+                "contributions": contributions,
+            }
+
+        result = self._range_series("explain", ranges, evaluate)
+        result["base_value"] = self.sales_stats.mean_y
+        return result
+
+    @AI_INFERENCE_DURATION.labels("explain_predictions").time()
+    def explain_predictions(self, future_dates: List[str]) -> np.ndarray:
+        """Returns per-feature contributions to the predictions, (dates, features)."""
+        if self.sales_stats.count < 2:
+            raise ModelNotTrainedError("Sales forecast model has not been trained")
+        X = to_ordinals(future_dates).astype(float)
+        base_value, contributions = self.sales_stats.contributions(X)
+        return contributions
+
+    async def get_customer_features(self) -> pd.DataFrame:
+        """Loads per-customer spend and line counts for training and inference."""
+        rows = await self.data_service.get_customer_features()
+        return pd.DataFrame(rows, columns=['customer_name', 'total', 'order_count'])
+
+    async def train_customer_segmentation_model(self) -> Optional[str]:
+        """Trains a KMeans model for customer segmentation and publishes a version."""
+        df_grouped = await self.get_customer_features()
         if df_grouped.empty:
             app_logger.warning("No data available for training customer segmentation model")
-            return
-        X = df_grouped[['total', 'order_count']]
-        X_scaled = self.scaler.fit_transform(X)
-        self.kmeans_model = KMeans(n_clusters=3, random_state=42)
-        self.kmeans_model.fit(X_scaled)
-        self.save_model(self.kmeans_model, self.kmeans_model_path)
-        app_logger.info("Customer segmentation model trained and saved")
-
-    def segment_customers(self) -> pd.DataFrame:
+            return None
+        X = df_grouped[['total', 'order_count']].to_numpy(dtype=float)
+        with AI_TRAINING_DURATION.labels(CUSTOMER_SEGMENTATION).time():
+            artifact = await self.run_in_pool(fit_segmentation, X, 3)
+            version = await self.publish_model(
+                CUSTOMER_SEGMENTATION,
+                artifact,
+                {"customers": len(df_grouped), "n_clusters": 3},
+            )
+        app_logger.info(
+            "Customer segmentation model trained and saved", version=version
+        )
+        return version
+
+    async def segment_customers(self) -> pd.DataFrame:
         """Segments customers using the trained model."""
         if not self.kmeans_model:
-            self.train_customer_segmentation_model()
-        orders = self.data_service.get_all_sales_orders(limit=10000)
-        df = dd.from_pandas(pd.DataFrame([{
-            "customer_name": order.customer_name,
-            "total": sum([item.quantity * item.price for item in order.items]),
-            "order_count": len(order.items)
-        } for order in orders]), npartitions=4)
-        df_grouped = df.groupby('customer_name').agg({
-            'total': 'sum',
-            'order_count': 'sum'
-        }).compute().reset_index()
-        X = df_grouped[['total', 'order_count']]
-        X_scaled = self.scaler.transform(X)
-        df_grouped['segment'] = self.kmeans_model.predict(X_scaled)
+            raise ModelNotTrainedError(
+                "Customer segmentation model has not been trained"
+            )
+        # Read both once so a reload while we wait cannot mix versions
+        artifact = {"kmeans": self.kmeans_model, "scaler": self.scaler}
+        df_grouped = await self.get_customer_features()
+        if df_grouped.empty:
+            # sklearn rejects an empty feature array
+            df_grouped['segment'] = pd.Series(dtype=int)
+            return df_grouped
+        X = df_grouped[['total', 'order_count']].to_numpy(dtype=float)
+        with AI_INFERENCE_DURATION.labels("segment_customers").time():
+            df_grouped['segment'] = await self.run_in_pool(
+                predict_segments, artifact, X
+            )
         return df_grouped
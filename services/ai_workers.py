@@ -0,0 +1,30 @@
+"""CPU-bound model work run in the AI process pool.
+
+Functions here are top-level so they can be pickled, and the module only
+imports numerical libraries so spawned pool processes start quickly.
+"""
+from typing import Dict
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+from utils.running_stats import RunningLinearRegression
+
+
+def fit_sales_stats(
+    ordinals: np.ndarray, totals: np.ndarray, counts: np.ndarray
+) -> RunningLinearRegression:
+    """Builds forecast statistics from (date ordinal, total, order count) day rows."""
+    return RunningLinearRegression.from_groups(ordinals, totals, counts)
+
+
+def fit_segmentation(X: np.ndarray, n_clusters: int = 3) -> Dict:
+    """Fits the scaler and KMeans model used for customer segmentation."""
+    scaler = StandardScaler()
+    kmeans_model = KMeans(n_clusters=n_clusters, random_state=42)
+    kmeans_model.fit(scaler.fit_transform(X))
+    return {"kmeans": kmeans_model, "scaler": scaler}
+
+
+def predict_segments(artifact: Dict, X: np.ndarray) -> np.ndarray:
+    """Assigns each feature row to a customer segment."""
+    return artifact["kmeans"].predict(artifact["scaler"].transform(X))
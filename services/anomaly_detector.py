@@ -1,12 +1,21 @@
 import numpy as np
 from utils.logger import app_logger
 from services.notification_service import NotificationService
-from services.cache_service import cache
+from services.anomaly_sink import AnomalySink
 from confluent_kafka import Consumer, KafkaError, TopicPartition
 from models.anomaly import Anomaly
 from utils.async_db import get_async_session
+from utils.metrics import (
+    ANOMALIES_DETECTED,
+    ANOMALY_BATCH_SIZE,
+    ANOMALY_CONSUMER_LAG,
+    ANOMALY_MESSAGES,
+)
+from utils.running_stats import RunningStatistics
 from config.settings import settings
+from sqlalchemy.future import select
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 
 class AnomalyDetector:
@@ -14,6 +23,7 @@ class AnomalyDetector:
 
     def __init__(self):
         self.notification_service = NotificationService()
+        self.anomaly_sink = AnomalySink()
         self.kafka_consumer = Consumer({
             'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
             'group.id': 'anomaly_detector_group',
@@ -21,55 +31,150 @@ class AnomalyDetector:
             'enable.partition.eof': False,
         })
         self.kafka_consumer.subscribe(['sales_data'])
+        # librdkafka forbids closing a consumer while consume() runs, so polls
+        # go through one thread that close() drains first
+        self.consume_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="kafka-consume"
+        )
+        self.stats = RunningStatistics(
+            decay=settings.ANOMALY_STATS_DECAY,
+            window=settings.ANOMALY_STATS_WINDOW,
+        )
+        self.stats_seeded = False
 
     async def consume_stream(self):
-        """Consumes data from Kafka and processes it."""
-        while True:
-            msg = self.kafka_consumer.poll(1.0)
-            if msg is None:
-                continue
+        """Consumes data from Kafka in micro-batches and processes it."""
+        await self.seed_statistics()
+        self.anomaly_sink.start()
+        self.notification_service.start()
+        loop = asyncio.get_running_loop()
+        timeout = settings.KAFKA_BATCH_TIMEOUT_MS / 1000
+        try:
+            while True:
+                messages = await loop.run_in_executor(
+                    self.consume_executor,
+                    self.kafka_consumer.consume,
+                    settings.KAFKA_BATCH_SIZE,
+                    timeout,
+                )
+                if not messages:
+                    continue
+                ANOMALY_BATCH_SIZE.observe(len(messages))
+                self.record_consumer_lag(messages)
+                values = self.decode_batch(messages)
+                if values.size:
+                    await self.process_batch(values)
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Flushes buffered anomalies and alerts and releases the Kafka consumer.
+
+        A cancelled ``consume_stream`` leaves its poll running in the
+        consume thread; it returns within the batch timeout, and the
+        consumer is only closed after that.
+        """
+        await self.anomaly_sink.stop()
+        await self.notification_service.close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.consume_executor.shutdown)
+        self.kafka_consumer.close()
+
+    def decode_batch(self, messages) -> np.ndarray:
+        """Decodes a batch of Kafka messages into a float array, skipping bad ones."""
+        values = []
+        for msg in messages:
             if msg.error():
                 app_logger.error("Kafka error", error=str(msg.error()))
                 continue
-            data = float(msg.value().decode('utf-8'))
-            await self.process_data(data)
+            try:
+                values.append(float(msg.value()))
+            except (TypeError, ValueError):
+                app_logger.error("Invalid sales data message", value=repr(msg.value()))
+        return np.array(values, dtype=float)
+
+    def record_consumer_lag(self, messages):
+        """Sets each partition's lag from its last offset and cached high watermark."""
+        last_offsets = {}
+        for msg in messages:
+            if not msg.error():
+                last_offsets[(msg.topic(), msg.partition())] = msg.offset()
+        for (topic, partition), offset in last_offsets.items():
+            try:
+                # Every fetch refreshes the cached high watermark, so this
+                # never calls the broker
+                low, high = self.kafka_consumer.get_watermark_offsets(
+                    TopicPartition(topic, partition), cached=True
+                )
+            except Exception as e:
+                app_logger.error(
+                    "Failed to read Kafka watermarks",
+                    partition=partition,
+                    error=str(e),
+                )
+                continue
+            if high >= 0:
+                lag = max(high - offset - 1, 0)
+                ANOMALY_CONSUMER_LAG.labels(str(partition)).set(lag)
+
+    async def process_batch(self, values: np.ndarray):
+        """Scores a batch of values in one vectorized pass and handles anomalies."""
+        anomalies = values[await self.detect_anomalies(values)]
+        ANOMALY_MESSAGES.inc(values.size)
+        ANOMALIES_DETECTED.inc(anomalies.size)
+        for value in anomalies.tolist():
+            app_logger.warning("Anomaly detected", value=value)
+            await self.store_anomaly(value)
+            await self.notification_service.send_anomaly_alert(value)
 
     async def process_data(self, value: float):
         """Processes incoming data and checks for anomalies."""
         is_anomaly = await self.detect_anomaly(value)
+        ANOMALY_MESSAGES.inc()
         if is_anomaly:
+            ANOMALIES_DETECTED.inc()
             app_logger.warning("Anomaly detected", value=value)
             await self.store_anomaly(value)
             await self.notification_service.send_anomaly_alert(value)
 
     async def store_anomaly(self, value: float):
-        """Stores the detected anomaly in the database."""
-        async with get_async_session() as session:
-            anomaly = Anomaly(value=value)
-            session.add(anomaly)
-            await session.commit()
-            app_logger.info("Anomaly stored", value=value)
+        """Queues the detected anomaly for a buffered bulk insert."""
+        await self.anomaly_sink.add(value)
 
-    @cache.cached(timeout=3600)
     async def get_historical_data(self):
-        """Retrieves historical data for adaptive thresholding."""
-        # Fetch data from the database
+        """Retrieves historical data used to seed the running statistics."""
         async with get_async_session() as session:
-            result = await session.execute("SELECT value FROM anomalies")
+            result = await session.execute(select(Anomaly.value).order_by(Anomaly.id))
             data = [row[0] for row in result.fetchall()]
-            return np.array(data)
+            return np.array(data, dtype=float)
 
-    async def calculate_dynamic_threshold(self):
-        """Calculates an adaptive threshold based on historical data."""
+    async def seed_statistics(self):
+        """Seeds the running statistics from the database once."""
+        if self.stats_seeded:
+            return
         data = await self.get_historical_data()
-        if data.size == 0:
+        self.stats.update_batch(data)
+        self.stats_seeded = True
+        app_logger.info("Anomaly statistics seeded", count=self.stats.count)
+
+    def calculate_dynamic_threshold(self) -> float:
+        """Calculates an adaptive threshold from the running statistics."""
+        if self.stats.count == 0:
             return 0.0
-        mean = np.mean(data)
-        std_dev = np.std(data)
-        threshold = mean + (2 * std_dev)  # 95% confidence interval
-        return threshold
+        return self.stats.mean + (settings.ANOMALY_THRESHOLD_SIGMA * self.stats.std)
 
     async def detect_anomaly(self, current_value: float) -> bool:
-        """Detects if the current value is an anomaly."""
-        threshold = await self.calculate_dynamic_threshold()
+        """Detects if the value is an anomaly and folds it into the statistics."""
+        if not self.stats_seeded:
+            await self.seed_statistics()
+        threshold = self.calculate_dynamic_threshold()
+        self.stats.update(current_value)
         return current_value > threshold
+
+    async def detect_anomalies(self, values: np.ndarray) -> np.ndarray:
+        """Scores a batch against the threshold in effect before the batch arrived."""
+        if not self.stats_seeded:
+            await self.seed_statistics()
+        threshold = self.calculate_dynamic_threshold()
+        self.stats.update_batch(values)
+        return values > threshold
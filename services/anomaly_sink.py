@@ -0,0 +1,171 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from models.anomaly import Anomaly
+from utils.async_db import get_async_session
+from utils.logger import app_logger
+from config.settings import settings
+
+
+class AnomalySink:
+    """Write-behind buffer that persists anomalies with multi-row INSERTs.
+
+    A failed flush is retried with exponential backoff. While it waits, the
+    queue keeps filling, and producers wait once it is full. Rows are only
+    dropped, and logged, after the last retry fails.
+    """
+
+    def __init__(
+        self,
+        flush_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        flush_retries: Optional[int] = None,
+        flush_backoff: Optional[float] = None,
+    ):
+        self.flush_size = flush_size or settings.ANOMALY_FLUSH_SIZE
+        self.flush_interval = (
+            flush_interval or settings.ANOMALY_FLUSH_INTERVAL_MS / 1000
+        )
+        if flush_retries is None:
+            flush_retries = settings.ANOMALY_FLUSH_RETRIES
+        self.flush_retries = flush_retries
+        if flush_backoff is None:
+            flush_backoff = settings.ANOMALY_FLUSH_BACKOFF_MS / 1000
+        self.flush_backoff = flush_backoff
+        # Bounded queue: producers wait once it is full, capping memory when the
+        # DB is slow
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=max_queue or settings.ANOMALY_SINK_MAX_QUEUE
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flush_count = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.flush_retry_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def metrics(self) -> Dict[str, float]:
+        """Returns counters for sizing the sink."""
+        return {
+            "queue_depth": self.queue_depth,
+            "flush_count": self.flush_count,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "flush_retry_count": self.flush_retry_count,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": (
+                self.total_flush_latency / self.flush_count if self.flush_count else 0.0
+            ),
+        }
+
+    def start(self):
+        """Starts the background flush task if it is not running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, value: float):
+        """Buffers an anomaly for the next flush."""
+        self.start()
+        await self.queue.put({"value": float(value), "detected_at": datetime.utcnow()})
+
+    async def _run(self):
+        while True:
+            rows = [await self.queue.get()]
+            try:
+                await self._collect(rows)
+            finally:
+                # Shielded so a shutdown cancel never drops rows already dequeued
+                await asyncio.shield(self._write(rows))
+
+    async def _collect(self, rows: List[Dict]):
+        """Keeps pulling rows until the batch is full or the flush interval elapses."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(rows) < self.flush_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                rows.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                return
+
+    def _drain(self) -> List[Dict]:
+        rows = []
+        while not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+        return rows
+
+    async def flush(self):
+        """Writes everything currently buffered."""
+        rows = self._drain()
+        for start in range(0, len(rows), self.flush_size):
+            await self._write(rows[start:start + self.flush_size])
+
+    async def _insert(self, rows: List[Dict]):
+        async with get_async_session() as session:
+            await session.execute(insert(Anomaly).values(rows))
+            await session.commit()
+
+    async def _write(self, rows: List[Dict]):
+        if not rows:
+            return
+        async with self._flush_lock:
+            started = time.perf_counter()
+            for attempt in range(self.flush_retries + 1):
+                try:
+                    await self._insert(rows)
+                    break
+                except Exception as e:
+                    if attempt == self.flush_retries:
+                        self.failed_rows += len(rows)
+                        app_logger.error(
+                            "Failed to flush anomalies, dropping them",
+                            count=len(rows),
+                            attempts=attempt + 1,
+                            error=str(e),
+                            anomalies=[
+                                (row["detected_at"].isoformat(), row["value"])
+                                for row in rows
+                            ],
+                        )
+                        return
+                    self.flush_retry_count += 1
+                    delay = self.flush_backoff * 2 ** attempt
+                    app_logger.warning(
+                        "Failed to flush anomalies, retrying",
+                        count=len(rows),
+                        attempt=attempt + 1,
+                        delay=delay,
+                        error=str(e),
+                    )
+                    await asyncio.sleep(delay)
+            latency = time.perf_counter() - started
+            self.flush_count += 1
+            self.flushed_rows += len(rows)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            app_logger.debug("Anomalies flushed", count=len(rows), latency=latency)
+
+    async def stop(self):
+        """Stops the background task and flushes any remaining anomalies."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -1,15 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 from services.auth_service import AuthService
 from services.data_service import DataService
-from services.ai_insights import AIInsights
-from pydantic import BaseModel, Field
+from services.ai_insights import AIInsights, ModelNotTrainedError
+from services.cache_service import cache
+from services.security.security import PasswordQueueFull
+from services.training_jobs import TrainingJobs
+from pydantic import BaseModel, Field, ValidationError
 from utils.logger import app_logger
-from typing import List, Dict
+from utils.metrics import REQUEST_LATENCY, mark_process_dead
+from utils.profiling import (
+    PROFILE_HEADER, StackSampler, current_timings, has_profiling_token, phase,
+    reset_timings, server_timing, should_profile, start_timings, store_profile,
+)
+from utils.permissions import has_permission, permission_mask
+from utils.redis_pool import close_redis, get_redis
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple
+from datetime import date, datetime, timedelta
+from functools import wraps
 from config.settings import settings
-import aioredis
+import asyncio
+import json
+import time
 
 # Versioned API prefix
 API_VERSION = "/api/v1"
@@ -34,15 +48,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize rate limiter
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observes request latency labelled by route template.
+
+    Labelling by template rather than path keeps path parameters from
+    adding series.
+    """
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(
+            request.method, route_path, str(status_code)
+        ).observe(time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Adds a Server-Timing breakdown and profiles requests that opt in or are sampled.
+
+    Server-Timing is only sent to every client with ``SERVER_TIMING_ENABLED``;
+    otherwise only requests carrying the profiling token get it.
+    """
+    token = start_timings()
+    timings = current_timings()
+    profile_header = request.headers.get(PROFILE_HEADER)
+    trusted = has_profiling_token(profile_header)
+    sampler = StackSampler() if should_profile(profile_header) else None
+    if sampler is not None and not sampler.start():
+        # Another request is being profiled; its sampler already covers this one
+        sampler = None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        total = time.perf_counter() - start
+        reset_timings(token)
+        stacks = sampler.stop() if sampler is not None else None
+    if settings.SERVER_TIMING_ENABLED or trusted:
+        response.headers["Server-Timing"] = server_timing(timings, total)
+    if stacks:
+        route = request.scope.get("route")
+        name = f"{request.method}-{route.path if route is not None else 'unmatched'}"
+        try:
+            loop = asyncio.get_running_loop()
+            response.headers["X-Profile-Id"] = await loop.run_in_executor(
+                None, store_profile, stacks, name
+            )
+        except Exception as e:
+            app_logger.error("Failed to store request profile", error=str(e))
+    return response
+
+
+# Initialize the rate limiter on the cache's Redis pool and start model reloading
 @app.on_event("startup")
 async def startup():
-    redis = await aioredis.create_redis_pool(settings.REDIS_URL)
-    await FastAPILimiter.init(redis)
+    await FastAPILimiter.init(await get_redis())
+    ai_insights.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await training_jobs.close()
+    await ai_insights.close()
+    await cache.close()
+    await close_redis()
+    mark_process_dead()
 
 auth_service = AuthService()
 data_service = DataService()
 ai_insights = AIInsights()
+training_jobs = TrainingJobs(ai_insights)
 
 
 class Item(BaseModel):
@@ -56,29 +139,60 @@ class SalesOrderRequest(BaseModel):
     items: List[Item]
 
 
-def get_current_user(authorization: str = Header(None)):
-    """Retrieves the current authenticated user based on the JWT token."""
+class BulkSalesOrderRequest(SalesOrderRequest):
+    created_at: Optional[datetime] = Field(None, example="2023-12-01T09:30:00")
+
+
+class TrainingJobRequest(BaseModel):
+    model: str = Field(..., example="sales_forecast")
+
+
+class ForecastRange(BaseModel):
+    start: date = Field(..., example="2024-01-01")
+    end: date = Field(..., example="2024-03-31")
+    freq: str = Field("D", example="W")
+
+
+class ForecastRequest(BaseModel):
+    series: List[ForecastRange] = Field(
+        ..., min_items=1, max_items=settings.AI_FORECAST_MAX_SERIES
+    )
+
+
+class LoginRequest(BaseModel):
+    username: str = Field(..., example="user1")
+    password: str = Field(..., example="securepassword")
+
+
+async def get_current_user(authorization: str = Header(None)):
+    """Retrieves the current authenticated user based on the JWT token.
+
+    Async so it runs on the event loop rather than in the threadpool: the
+    verified-token cache is not thread-safe, and a cache hit costs less
+    than the thread hop.
+    """
     if authorization is None or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     token = authorization.split(" ")[1]
-    decoded = auth_service.verify_token(token)
+    with phase("auth"):
+        decoded = auth_service.verify_token(token)
     if decoded is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     return decoded
 
 
-def has_permission(user, required_permissions: List[str]) -> bool:
-    """Checks if the user has the required permissions."""
-    return set(required_permissions).issubset(set(user.get('permissions', [])))
-
-
 def requires_permissions(required_permissions: List[str]):
-    """Decorator to enforce permission-based access control."""
+    """Decorator to enforce permission-based access control.
+
+    The required permissions are compiled to a bitmask once, when the route
+    is declared. The route must take ``user=Depends(get_current_user)``.
+    """
+    required_mask = permission_mask(required_permissions, strict=True)
 
     def decorator(func):
+        @wraps(func)
         async def wrapper(*args, **kwargs):
-            user = get_current_user()
-            if not has_permission(user, required_permissions):
+            if not has_permission(kwargs["user"], required_mask):
                 raise HTTPException(status_code=403, detail="Access forbidden")
             return await func(*args, **kwargs)
         return wrapper
@@ -86,6 +200,41 @@ def requires_permissions(required_permissions: List[str]):
     return decorator
 
 
+@app.post(
+    API_VERSION + "/auth/login/",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+    response_model=Dict[str, str],
+    summary="Log in",
+    description=(
+        "Authenticates a user and returns a JWT token. "
+        "Returns 503 while too many logins are pending."
+    )
+)
+async def login(credentials: LoginRequest):
+    """Authenticates a user and issues an access token."""
+    try:
+        user = await auth_service.authenticate_user(
+            credentials.username, credentials.password
+        )
+    except PasswordQueueFull as e:
+        app_logger.warning("Login refused, password queue full", error=str(e))
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts",
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        app_logger.error("Error during login", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid username or password",
+        )
+    token = auth_service.create_token(user.id, user.role, user.permissions or [])
+    return {"access_token": token, "token_type": "bearer"}
+
+
 @app.post(
     API_VERSION + "/orders/",
     dependencies=[Depends(RateLimiter(times=10, seconds=60))],
@@ -102,12 +251,138 @@ async def create_order(order: SalesOrderRequest, user=Depends(get_current_user))
             [item.dict() for item in order.items],
             user_id=user["user_id"]
         )
+        ai_insights.record_sales_order(
+            new_order.created_at,
+            sum(item.quantity * item.price for item in order.items)
+        )
         return {"order_id": new_order.id}
     except Exception as e:
         app_logger.error("Error creating order", error=str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+async def iter_bulk_payload(
+    request: Request,
+) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    """Yields (index, payload, error) for each order in a JSON array or NDJSON body."""
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        invalid = HTTPException(
+            status_code=400, detail="Body must be a JSON array of orders"
+        )
+        try:
+            payloads = await request.json()
+        except ValueError:
+            raise invalid
+        if not isinstance(payloads, list):
+            raise invalid
+        for index, payload in enumerate(payloads):
+            yield index, payload, None
+        return
+
+    # NDJSON is parsed as it streams in so large imports are never held in memory whole
+    index, buffer = 0, b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, *_parse_ndjson_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, *_parse_ndjson_line(buffer)
+
+
+def _parse_ndjson_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+
+
+async def ingest_order_chunk(
+    chunk: List[Tuple[int, Dict]], user_id: int, errors: List[Dict]
+) -> int:
+    """Inserts one chunk of validated orders and returns how many were stored."""
+    result = await data_service.add_sales_orders_bulk(
+        [order for _, order in chunk], user_id=user_id
+    )
+    for error in result["errors"]:
+        errors.append({"index": chunk[error["index"]][0], "error": error["error"]})
+    ai_insights.record_sales_orders(
+        [row["created_at"] for row in result["orders"]],
+        [row["total"] for row in result["orders"]]
+    )
+    return len(result["orders"])
+
+
+@app.post(
+    API_VERSION + "/orders/bulk",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+    response_model=Dict,
+    summary="Bulk-create sales orders",
+    description=(
+        "Creates many sales orders from a JSON array or an NDJSON stream, "
+        "in chunked transactions."
+    )
+)
+@requires_permissions(["create_order"])
+async def bulk_create_orders(request: Request, user=Depends(get_current_user)):
+    """Creates sales orders in bulk, reporting per-row errors without aborting."""
+    inserted, errors = 0, []
+    chunk: List[Tuple[int, Dict]] = []
+    try:
+        async for index, payload, error in iter_bulk_payload(request):
+            if error is None:
+                try:
+                    order = BulkSalesOrderRequest.parse_obj(payload)
+                    chunk.append((index, order.dict()))
+                except ValidationError as e:
+                    error = str(e)
+            if error is not None:
+                errors.append({"index": index, "error": error})
+            if len(chunk) >= settings.BULK_INGEST_CHUNK_SIZE:
+                inserted += await ingest_order_chunk(chunk, user["user_id"], errors)
+                chunk = []
+        if chunk:
+            inserted += await ingest_order_chunk(chunk, user["user_id"], errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        app_logger.error(
+            "Error in bulk order ingestion", error=str(e), inserted=inserted
+        )
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    return {
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": errors[:settings.BULK_INGEST_MAX_ERRORS],
+    }
+
+
+@app.get(
+    API_VERSION + "/orders/",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict,
+    summary="List sales orders",
+    description="Lists sales orders newest first with cursor-based pagination."
+)
+@requires_permissions(["view_order"])
+async def list_orders(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Lists sales orders; pass the returned next_cursor to fetch the following page."""
+    try:
+        return await data_service.list_sales_orders(limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except Exception as e:
+        app_logger.error("Error listing orders", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 @app.get(
     API_VERSION + "/ai/predict-sales/",
     dependencies=[Depends(RateLimiter(times=5, seconds=60))],
@@ -116,16 +391,99 @@ async def create_order(order: SalesOrderRequest, user=Depends(get_current_user))
     description="Predicts future sales based on provided dates."
 )
 @requires_permissions(["view_predictions"])
-async def predict_sales(future_dates: List[str], user=Depends(get_current_user)):
+async def predict_sales(
+    future_dates: List[str] = Query(...), user=Depends(get_current_user)
+):
     """Predicts future sales based on provided dates."""
     try:
         predictions = ai_insights.predict_sales(future_dates)
         return {"predictions": predictions}
+    except ModelNotTrainedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         app_logger.error("Error predicting sales", error=str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+def run_forecast(method, ranges: List[ForecastRange]) -> Dict[str, Any]:
+    """Runs a range forecast; invalid ranges map to 400, an untrained model to 409."""
+    try:
+        return method([(r.start, r.end, r.freq) for r in ranges])
+    except ModelNotTrainedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        app_logger.error("Error forecasting sales", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.get(
+    API_VERSION + "/ai/forecast/",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, Any],
+    summary="Forecast sales over a date range",
+    description=(
+        "Predicts sales at daily (D), weekly (W) or monthly (M) points "
+        "between start and end."
+    )
+)
+@requires_permissions(["view_predictions"])
+async def forecast_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    freq: str = "D",
+    user=Depends(get_current_user)
+):
+    """Forecasts one range (default: the next 30 days), cached per model version."""
+    start = start or datetime.utcnow().date()
+    end = end or start + timedelta(days=29)
+    series = [ForecastRange(start=start, end=end, freq=freq)]
+    return run_forecast(ai_insights.forecast, series)
+
+
+@app.post(
+    API_VERSION + "/ai/forecast/",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, Any],
+    summary="Forecast sales over several date ranges",
+    description=(
+        "Predicts sales for several ranges at once, "
+        "evaluated in a single vectorized pass."
+    )
+)
+@requires_permissions(["view_predictions"])
+async def forecast_sales_batch(
+    request: ForecastRequest, user=Depends(get_current_user)
+):
+    """Forecasts every requested range; results are cached per model version."""
+    return run_forecast(ai_insights.forecast, request.series)
+
+
+@app.get(
+    API_VERSION + "/ai/explain-forecast/",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, Any],
+    summary="Explain a sales forecast",
+    description=(
+        "Returns forecast points with each feature's contribution "
+        "relative to the training mean."
+    )
+)
+@requires_permissions(["view_predictions"])
+async def explain_forecast(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    freq: str = "D",
+    user=Depends(get_current_user)
+):
+    """Explains one forecast range (default: the next 30 days), cached per version."""
+    start = start or datetime.utcnow().date()
+    end = end or start + timedelta(days=29)
+    series = [ForecastRange(start=start, end=end, freq=freq)]
+    return run_forecast(ai_insights.explain, series)
+
+
 @app.get(
     API_VERSION + "/ai/segment-customers/",
     dependencies=[Depends(RateLimiter(times=5, seconds=60))],
@@ -137,8 +495,113 @@ async def predict_sales(future_dates: List[str], user=Depends(get_current_user))
 async def segment_customers(user=Depends(get_current_user)):
     """Segments customers using clustering algorithms."""
     try:
-        segments = ai_insights.segment_customers()
+        segments = await ai_insights.segment_customers()
         return segments.to_dict(orient='records')
+    except ModelNotTrainedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         app_logger.error("Error segmenting customers", error=str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.post(
+    API_VERSION + "/ai/training-jobs/",
+    dependencies=[Depends(RateLimiter(times=5, seconds=60))],
+    response_model=Dict[str, Any],
+    status_code=202,
+    summary="Start a training job",
+    description="Starts training a model in the background and returns the job. "
+                "If a job for the same model is already active, that job is returned."
+)
+@requires_permissions(["train_models"])
+async def start_training_job(
+    request: TrainingJobRequest, user=Depends(get_current_user)
+):
+    """Starts a background training job."""
+    try:
+        return await training_jobs.submit(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        app_logger.error("Error starting training job", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.get(
+    API_VERSION + "/ai/training-jobs/{job_id}",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, Any],
+    summary="Get a training job",
+    description=(
+        "Returns a training job's status and, once it has succeeded, "
+        "the published model version."
+    )
+)
+@requires_permissions(["train_models"])
+async def get_training_job(job_id: str, user=Depends(get_current_user)):
+    """Returns the status of a training job."""
+    try:
+        job = await training_jobs.get(job_id)
+    except Exception as e:
+        app_logger.error("Error reading training job", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+
+@app.get(
+    API_VERSION + "/sales/trend",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, List],
+    summary="Daily sales trend",
+    description=(
+        "Returns per-day sales totals, order counts and line counts "
+        "from the daily rollup."
+    )
+)
+@requires_permissions(["view_order"])
+async def sales_trend(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user=Depends(get_current_user)
+):
+    """Returns per-day sales totals for a date range (default: the last 30 days)."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days + 1 > settings.SALES_TREND_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The range must not exceed {settings.SALES_TREND_MAX_DAYS} days",
+        )
+    try:
+        return await data_service.get_sales_trend(start, end)
+    except Exception as e:
+        app_logger.error("Error retrieving sales trend", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@app.get(
+    API_VERSION + "/sales/heatmap",
+    dependencies=[Depends(RateLimiter(times=60, seconds=60))],
+    response_model=Dict[str, List],
+    summary="Weekday x hour sales heatmap",
+    description="Returns sales by weekday and hour from precomputed weekly slices."
+)
+@requires_permissions(["view_order"])
+async def sales_heatmap(
+    as_of: Optional[date] = None,
+    weeks: Optional[int] = Query(None, ge=1),
+    product_name: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Returns the sales heatmap for the weeks up to ``as_of`` (default: today)."""
+    try:
+        return await data_service.get_sales_heatmap(
+            as_of or datetime.utcnow().date(), weeks=weeks, product_name=product_name
+        )
+    except Exception as e:
+        app_logger.error("Error retrieving sales heatmap", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
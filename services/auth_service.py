@@ -1,23 +1,38 @@
-from typing import Optional, Dict, List
+from typing import Optional, List, Mapping
 from services.interfaces.auth_interface import AuthServiceInterface
 from config.settings import settings
 from utils.logger import app_logger
-from services.security.security import verify_password
+from services.security.security import password_hasher
 from models.user import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from utils.async_db import get_async_session
+from utils.permissions import permission_mask
+from utils.profiling import phase
+from services.cache_service import LocalCache
+from types import MappingProxyType
+import hashlib
 import jwt
+import time
 from datetime import datetime, timedelta
 
 
 class AuthService(AuthServiceInterface):
-    """Service for authentication-related operations."""
+    """Service for authentication-related operations.
+
+    Verified tokens are kept in a bounded cache keyed by the token's digest
+    until their ``exp``, so repeat requests skip signature verification.
+    The cache is not thread-safe, so call ``verify_token`` from the event
+    loop only.
+    """
 
     def __init__(self):
         self.secret_key = settings.JWT_SECRET_KEY
         self.algorithm = settings.JWT_ALGORITHM
         self.expiry_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        self.verified_tokens = LocalCache(
+            settings.AUTH_TOKEN_CACHE_SIZE, self.expiry_minutes * 60
+        )
 
     def create_token(self, user_id: int, role: str, permissions: List[str]) -> str:
         """Creates a JWT token for a user."""
@@ -33,16 +48,31 @@ class AuthService(AuthServiceInterface):
         app_logger.info("JWT token created", user_id=user_id, role=role)
         return token
 
-    def verify_token(self, token: str) -> Optional[Dict]:
-        """Verifies a JWT token and returns the decoded payload."""
+    def verify_token(self, token: str) -> Optional[Mapping]:
+        """Verifies a JWT token and returns the decoded payload.
+
+        The payload is read-only and carries a compiled ``permission_mask``.
+        """
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+        cached = self.verified_tokens.get(digest)
+        if cached is not None:
+            return cached
         try:
             decoded = jwt.decode(
                 token, self.secret_key,
                 algorithms=[self.algorithm],
                 issuer="NebuloViz"
             )
-            app_logger.info("JWT token verified", user_id=decoded.get("user_id"))
-            return decoded
+            decoded["permission_mask"] = permission_mask(decoded.get("permissions", []))
+            claims = MappingProxyType(decoded)
+            ttl = self.verified_tokens.ttl
+            if "exp" in decoded:
+                ttl = decoded["exp"] - time.time()
+            self.verified_tokens.set(digest, claims, ttl)
+            app_logger.info(
+                "JWT token verified", sampled=True, user_id=decoded.get("user_id")
+            )
+            return claims
         except jwt.ExpiredSignatureError:
             app_logger.warning("JWT token expired")
             return None
@@ -54,13 +84,21 @@ class AuthService(AuthServiceInterface):
             return None
 
     async def authenticate_user(self, username: str, password: str) -> Optional[User]:
-        """Authenticates a user by username and password."""
+        """Authenticates a user by username and password.
+
+        Raises PasswordQueueFull when too many logins are already pending.
+        """
         async with get_async_session() as session:
             result = await session.execute(select(User).where(User.username == username))
             user = result.scalars().first()
-            if user and verify_password(password, user.hashed_password):
-                app_logger.info("User authenticated", username=username)
-                return user
-            else:
-                app_logger.warning("Authentication failed", username=username)
-                return None
+        # Verified after the session closes so a queued login holds no DB connection
+        with phase("auth"):
+            verified = user is not None and await password_hasher.verify(
+                password, user.hashed_password
+            )
+        if verified:
+            app_logger.info("User authenticated", username=username)
+            return user
+        else:
+            app_logger.warning("Authentication failed", username=username)
+            return None
@@ -0,0 +1,148 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Type
+import msgpack
+import numpy as np
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.attributes import set_committed_value
+# SalesOrder.user must resolve before the mappers are inspected
+import models.user  # noqa: F401
+from models.sales_order import SalesOrder, SalesOrderLine
+
+EXT_NDARRAY = 1
+EXT_DATETIME = 2
+EXT_DATE = 3
+EXT_MODEL = 4
+
+
+class JsonCodec:
+    """Legacy codec: JSON text, unknown objects stored as their string form."""
+
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class _ModelTag:
+    """Marker decoded from the first element of an encoded model row."""
+
+    __slots__ = ("schema",)
+
+    def __init__(self, schema: Dict):
+        self.schema = schema
+
+
+class MsgpackCodec:
+    """Binary codec that round-trips registered ORM models, NumPy arrays and datetimes.
+
+    A registered model is packed as a flat list ``[tag, *field_values,
+    *relation_values]`` so it costs a single pass of the packer, and is
+    rebuilt as a detached instance whose attributes are set as committed
+    values, the same way the ORM loader populates rows.
+    """
+
+    name = "msgpack"
+
+    def __init__(self):
+        self._schemas_by_type: Dict[type, Dict] = {}
+        self._schemas_by_name: Dict[str, Dict] = {}
+
+    def register(
+        self, model: Type, fields: List[str], relations: Optional[List[str]] = None
+    ):
+        """Registers a model whose ``fields`` (and loaded ``relations``) are cached."""
+        schema = {
+            "model": model,
+            "fields": fields,
+            "relations": relations or [],
+            "tag": msgpack.ExtType(EXT_MODEL, model.__name__.encode('ascii')),
+            "manager": class_mapper(model).class_manager,
+        }
+        self._schemas_by_type[model] = schema
+        self._schemas_by_name[model.__name__] = schema
+
+    def _default(self, obj: Any):
+        schema = self._schemas_by_type.get(type(obj))
+        if schema is not None:
+            # Read loaded state directly; never trigger a lazy load while serializing
+            state = obj.__dict__
+            row = [schema["tag"]]
+            row.extend(state.get(field) for field in schema["fields"])
+            for relation in schema["relations"]:
+                value = state.get(relation)
+                row.append(None if value is None else list(value))
+            return row
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode('ascii'))
+        if isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, obj.isoformat().encode('ascii'))
+        if isinstance(obj, np.ndarray):
+            if obj.dtype.hasobject:
+                raise TypeError("Object arrays cannot be cached")
+            data = np.ascontiguousarray(obj).tobytes()
+            payload = msgpack.packb(
+                [obj.dtype.str, list(obj.shape), data], use_bin_type=True
+            )
+            return msgpack.ExtType(EXT_NDARRAY, payload)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Cannot cache object of type {type(obj).__name__}")
+
+    def _ext_hook(self, code: int, data: bytes):
+        if code == EXT_MODEL:
+            return _ModelTag(self._schemas_by_name[data.decode('ascii')])
+        if code == EXT_DATETIME:
+            return datetime.fromisoformat(data.decode('ascii'))
+        if code == EXT_DATE:
+            return date.fromisoformat(data.decode('ascii'))
+        if code == EXT_NDARRAY:
+            dtype, shape, buffer = msgpack.unpackb(data, raw=False)
+            return np.frombuffer(buffer, dtype=np.dtype(dtype)).reshape(shape).copy()
+        return msgpack.ExtType(code, data)
+
+    def _list_hook(self, items: List) -> Any:
+        if not items or type(items[0]) is not _ModelTag:
+            return items
+        schema = items[0].schema
+        fields = schema["fields"]
+        obj = schema["manager"].new_instance()
+        obj.__dict__.update(zip(fields, items[1:len(fields) + 1]))
+        for relation, value in zip(schema["relations"], items[len(fields) + 1:]):
+            if value is not None:
+                set_committed_value(obj, relation, value)
+        return obj
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(
+            data,
+            ext_hook=self._ext_hook,
+            list_hook=self._list_hook,
+            raw=False,
+            strict_map_key=False,
+        )
+
+
+def build_codec(name: str):
+    """Returns the cache codec for ``name`` with the application's models registered."""
+    if name == JsonCodec.name:
+        return JsonCodec()
+    if name != MsgpackCodec.name:
+        raise ValueError(f"Unknown cache serializer: {name}")
+    codec = MsgpackCodec()
+    codec.register(
+        SalesOrderLine,
+        fields=["id", "sales_order_id", "product_name", "quantity", "price"],
+    )
+    codec.register(
+        SalesOrder,
+        fields=["id", "customer_name", "created_at", "user_id"],
+        relations=["items"],
+    )
+    return codec
@@ -1,56 +1,412 @@
-
-import aioredis
+from collections import OrderedDict
 from functools import wraps
 from config.settings import settings
+from services.cache_codec import build_codec
+from utils.logger import app_logger
+from utils.metrics import CACHE_EVENTS, CACHE_LATENCY
+from utils.profiling import phase
+from utils.redis_pool import get_redis
+from typing import Dict, List, Optional, Tuple
 import asyncio
-import json
+import inspect
+import struct
+import time
+import uuid
+
+# Entries are prefixed with their fresh-until timestamp; bump when the envelope changes
+ENTRY_FORMAT = "e1"
+ENTRY_HEADER = struct.Struct("!d")
+
+# Deletes the lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Reads the tag generations (KEYS) and then the entry they name, so a lookup
+# is one round trip. ARGV holds the entry key before and after the
+# generations.
+LOOKUP_SCRIPT = """
+local generations = {}
+for i = 1, #KEYS do
+    generations[i] = redis.call('get', KEYS[i]) or '0'
+end
+local fragment = table.concat(generations, '.')
+return {fragment, redis.call('get', ARGV[1] .. fragment .. ARGV[2])}
+"""
+
+
+class LocalCache:
+    """Size-bounded in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._entries[key] = (time.monotonic() + min(ttl, self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
 
 
 class CacheService:
-    """Cache service using Redis with hierarchical key patterns."""
+    """Cache service using Redis with generation-tagged keys.
+
+    Every cached function belongs to one or more tags (its own name by
+    default). Each tag has a generation counter in Redis that is embedded in
+    the entry key, so invalidating a tag is a single INCR: superseded entries
+    are never read again and age out by their TTL.
+
+    Misses are single-flight: concurrent callers in a process share one
+    computation per key, and with ``lock`` a Redis lock extends that across
+    workers. Entries stay readable for ``stale_ttl`` seconds after they
+    expire; a stale hit is served immediately while one background task
+    refreshes it.
 
-    def __init__(self):
-        self.redis_url = settings.REDIS_URL
-        self.namespace = settings.CACHE_NAMESPACE
-        self.redis = None
-        self.loop = asyncio.get_event_loop()
-        self.loop.run_until_complete(self.connect())
+    With ``CACHE_L1_ENABLED`` an in-process LRU sits in front of Redis and
+    also holds recently seen generations. Invalidations are broadcast over
+    Redis pub/sub so every worker drops its local generation, and the short
+    L1 TTL bounds staleness if a message is missed.
+    """
 
-    async def connect(self):
-        self.redis = await aioredis.create_redis_pool(self.redis_url)
+    def __init__(self, serializer: str = None, redis=None, l1_enabled: bool = None):
+        self.codec = build_codec(serializer or settings.CACHE_SERIALIZER)
+        # The codec name is in the namespace, so another codec's entries are
+        # never decoded
+        self.namespace = f"{settings.CACHE_NAMESPACE}:{self.codec.name}:{ENTRY_FORMAT}"
+        self.invalidation_channel = f"{self.namespace}:invalidate"
+        if l1_enabled is None:
+            l1_enabled = settings.CACHE_L1_ENABLED
+        self.l1 = (
+            LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL)
+            if l1_enabled
+            else None
+        )
+        self.stats = {
+            "l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0,
+            "stale_hits": 0, "coalesced": 0, "lock_waits": 0,
+        }
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Without an explicit client the shared pool opens on first use, never at import
+        self._redis = redis
+
+    async def _client(self):
+        if self._redis is not None:
+            return self._redis
+        return await get_redis()
 
     def _format_key(self, key_parts: List[str]):
         return f"{self.namespace}:" + ":".join(key_parts)
 
-    def cached(self, timeout=60):
-        """Decorator for caching function results with invalidation support."""
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _count(self, event: str):
+        self.stats[event] += 1
+        CACHE_EVENTS.labels(event).inc()
+
+    def metrics(self) -> Dict[str, int]:
+        """Returns per-tier hit/miss counters."""
+        return dict(self.stats, l1_size=len(self.l1) if self.l1 is not None else 0)
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen_for_invalidations())
+
+    async def _listen_for_invalidations(self):
+        """Drops the local generation of every tag any worker invalidates."""
+        while True:
+            try:
+                redis = await self._client()
+                channel, = await redis.subscribe(self.invalidation_channel)
+                async for tag in channel.iter(encoding='utf-8'):
+                    self.l1.delete(self._tag_key(tag))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                app_logger.error("Cache invalidation listener failed", error=str(e))
+            # Invalidations may have been missed while unsubscribed
+            self.l1.clear()
+            await asyncio.sleep(1)
+
+    async def _lookup(
+        self, name: str, tags: List[str], parts: List[str]
+    ) -> Tuple[str, Optional[bytes]]:
+        """Returns the entry key for the current generations of ``tags`` and its value.
+
+        Generations held in L1 name the key locally; otherwise
+        ``LOOKUP_SCRIPT`` reads them and the entry in one round trip.
+        """
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        if self.l1 is not None:
+            self._ensure_listener()
+            generations = [self.l1.get(key) for key in tag_keys]
+            if None not in generations:
+                fragment = b".".join(generations).decode('ascii')
+                key = self._format_key([name, fragment] + parts)
+                return key, await self._get(key)
+            self._count("l1_misses")
+        prefix = self._format_key([name]) + ":"
+        suffix = "".join(f":{part}" for part in parts)
+        redis = await self._client()
+        with CACHE_LATENCY.labels("redis_get").time():
+            fragment, value = await redis.eval(
+                LOOKUP_SCRIPT, keys=tag_keys, args=[prefix, suffix]
+            )
+        key = prefix + fragment.decode('ascii') + suffix
+        if self.l1 is not None:
+            for tag_key, generation in zip(tag_keys, fragment.split(b".")):
+                self.l1.set(tag_key, generation, self.l1.ttl)
+        if value is None:
+            self._count("l2_misses")
+            return key, None
+        self._count("l2_hits")
+        if self.l1 is not None:
+            self.l1.set(key, value, self.l1.ttl)
+        return key, value
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        if self.l1 is not None:
+            value = self.l1.get(key)
+            if value is not None:
+                self._count("l1_hits")
+                return value
+            self._count("l1_misses")
+        redis = await self._client()
+        with CACHE_LATENCY.labels("redis_get").time():
+            value = await redis.get(key)
+        if value is None:
+            self._count("l2_misses")
+            return None
+        self._count("l2_hits")
+        if self.l1 is not None:
+            self.l1.set(key, value, self.l1.ttl)
+        return value
+
+    async def _set(
+        self,
+        key: str,
+        value: bytes,
+        timeout: int,
+        release: Optional[Tuple[str, str]] = None,
+    ):
+        """Stores an entry, releasing a (lock_key, token) lock in the same trip."""
+        pipe = (await self._client()).pipeline()
+        pipe.set(key, value, expire=timeout)
+        if release is not None:
+            pipe.eval(RELEASE_LOCK_SCRIPT, keys=[release[0]], args=[release[1]])
+        await pipe.execute()
+        if self.l1 is not None:
+            self.l1.set(key, value, timeout)
+
+    def cached(
+        self,
+        timeout=60,
+        tags: Optional[List[str]] = None,
+        stale_ttl: Optional[int] = None,
+        lock: Optional[bool] = None,
+    ):
+        """Decorator for caching function results under invalidation tags.
+
+        Keys are built from the bound arguments with defaults applied, so
+        positional and keyword calls share an entry; ``self`` is left out so
+        entries are shared across service instances. ``stale_ttl`` and
+        ``lock`` default to ``CACHE_STALE_TTL`` and ``CACHE_LOCK_ENABLED``.
+        """
+        if stale_ttl is None:
+            stale_ttl = settings.CACHE_STALE_TTL
+        if lock is None:
+            lock = settings.CACHE_LOCK_ENABLED
 
         def decorator(func):
+            signature = inspect.signature(func)
+            skip_self = next(iter(signature.parameters), None) == "self"
+            func_tags = tags or [func.__name__]
+
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                key_parts = [func.__name__] + [str(arg) for arg in args] + [f"{k}={v}" for k, v in kwargs.items()]
-                key = self._format_key(key_parts)
-                cached_value = await self.redis.get(key)
-                if cached_value:
-                    # Deserialize the cached JSON string
-                    result = json.loads(cached_value)
-                    return result
-                result = await func(*args, **kwargs)
-                # Serialize the result to a JSON string
-                serialized_result = json.dumps(result, default=str)
-                await self.redis.set(key, serialized_result, expire=timeout)
-                return result
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = list(bound.arguments.items())[1 if skip_self else 0:]
+                with phase("cache"):
+                    key, cached_value = await self._lookup(
+                        func.__name__,
+                        func_tags,
+                        [f"{name}={value}" for name, value in arguments],
+                    )
+
+                async def load(background: bool):
+                    return await self._load(
+                        key, func, args, kwargs, timeout, stale_ttl, lock, background
+                    )
+
+                if cached_value is not None:
+                    fresh_until, payload = self._unpack(cached_value)
+                    if fresh_until <= time.time():
+                        self._count("stale_hits")
+                        self._refresh(key, load)
+                    with phase("cache"):
+                        return self.codec.loads(payload)
+                return await self._single_flight(key, load)
 
             return wrapper
 
         return decorator
 
-    async def invalidate(self, key_parts: List[str]):
-        """Invalidates cache keys matching a pattern."""
-        pattern = self._format_key(key_parts) + "*"
-        keys = await self.redis.keys(pattern)
-        if keys:
-            await self.redis.delete(*keys)
+    @staticmethod
+    def _pack(payload: bytes, timeout: int) -> bytes:
+        return ENTRY_HEADER.pack(time.time() + timeout) + payload
+
+    @staticmethod
+    def _unpack(data: bytes) -> Tuple[float, bytes]:
+        return ENTRY_HEADER.unpack_from(data)[0], data[ENTRY_HEADER.size:]
+
+    async def _single_flight(self, key: str, load):
+        """Runs ``load`` once per key however many callers miss concurrently."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("coalesced")
+            result, payload = await asyncio.shield(task)
+            # A background refresh that deferred to another worker's lock has no payload
+            if payload is not None:
+                # Followers decode their own copy so callers never share mutable results
+                return self.codec.loads(payload)
+        task = self._start(key, load, background=False)
+        result, payload = await asyncio.shield(task)
+        return result
+
+    def _start(self, key: str, load, background: bool) -> asyncio.Task:
+        # A task, so a cancelled caller does not cancel the followers' computation
+        task = asyncio.ensure_future(load(background))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def _refresh(self, key: str, load):
+        """Refreshes a stale entry in the background unless a refresh is running."""
+        if key in self._inflight:
+            return
+        task = self._start(key, load, background=True)
+        task.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            app_logger.error(
+                "Background cache refresh failed", error=str(task.exception())
+            )
+
+    async def _load(
+        self, key, func, args, kwargs, timeout, stale_ttl, lock, background
+    ):
+        """Computes and stores an entry, holding the distributed lock when enabled."""
+        redis = await self._client()
+        lock_key, token = f"{key}:lock", None
+        if lock:
+            token = uuid.uuid4().hex
+            with phase("cache"):
+                acquired = await redis.set(
+                    lock_key,
+                    token,
+                    pexpire=settings.CACHE_LOCK_TIMEOUT_MS,
+                    exist=redis.SET_IF_NOT_EXIST,
+                )
+            if not acquired:
+                if background:
+                    # Another worker is refreshing; keep serving the stale value
+                    return None, None
+                token = None
+                self._count("lock_waits")
+                with phase("cache"):
+                    payload = await self._wait_for_fill(key)
+                if payload is not None:
+                    return self.codec.loads(payload), payload
+        try:
+            with CACHE_LATENCY.labels("load").time():
+                result = await func(*args, **kwargs)
+            payload = self.codec.dumps(result)
+        except BaseException:
+            if token is not None:
+                await redis.eval(RELEASE_LOCK_SCRIPT, keys=[lock_key], args=[token])
+            raise
+        release = (lock_key, token) if token is not None else None
+        with phase("cache"):
+            await self._set(
+                key,
+                self._pack(payload, timeout),
+                timeout + stale_ttl,
+                release=release,
+            )
+        return result, payload
+
+    async def _wait_for_fill(self, key: str) -> Optional[bytes]:
+        """Polls Redis until the lock holder stores a fresh entry or the lock lapses."""
+        redis = await self._client()
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_MS / 1000)
+            value = await redis.get(key)
+            if value is not None:
+                fresh_until, payload = self._unpack(value)
+                if fresh_until > time.time():
+                    return payload
+        return None
+
+    async def invalidate(self, *tags: str):
+        """Invalidates every entry cached under ``tags`` with one INCR per tag.
+
+        All the INCRs go out in one round trip.
+        """
+        pipe = (await self._client()).pipeline()
+        for tag in tags:
+            pipe.incr(self._tag_key(tag))
+            # Generations outlive their entries, so a reset to 0 never revives one
+            pipe.expire(self._tag_key(tag), settings.CACHE_TAG_TTL)
+            if self.l1 is not None:
+                pipe.publish(self.invalidation_channel, tag)
+        await pipe.execute()
+        if self.l1 is not None:
+            for tag in tags:
+                self.l1.delete(self._tag_key(tag))
+
+    async def close(self):
+        """Stops the invalidation listener."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
 
 
 cache = CacheService()
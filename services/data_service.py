@@ -1,13 +1,28 @@
-from services.interfaces.data_interface import DataServiceInterface
+from services.interfaces.data_interface import DataServiceInterface, LoadStrategy
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy import func, insert, tuple_
 from config.settings import settings
 from utils.logger import app_logger
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Union
+from datetime import date, datetime, timedelta
 from models.sales_order import SalesOrder, SalesOrderLine
+from models.sales_rollup import DailySalesRollup, WeeklySalesHeatmapCell
+from services.sales_rollup import (
+    WEEKDAYS,
+    SalesRollupDelta,
+    heatmap_matrix,
+    rebuild_heatmap,
+    rebuild_rollup,
+    trend_series,
+    week_start,
+)
 from services.cache_service import cache
 from utils.async_db import get_async_session
 from functools import wraps
+import base64
+import json
 
 
 def service_error_handler(func):
@@ -24,6 +39,22 @@ def service_error_handler(func):
     return wrapper
 
 
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Encodes a (created_at, id) seek position as an opaque URL-safe token."""
+    raw = json.dumps([created_at.isoformat(), order_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodes a token produced by encode_cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        created_at, order_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
 class DataService(DataServiceInterface):
     """Service for data-related operations using async operations."""
 
@@ -31,7 +62,11 @@ class DataService(DataServiceInterface):
     async def add_sales_order(self, customer_name: str, items: List[Dict], user_id: int) -> SalesOrder:
         """Adds a new sales order to the database."""
         async with get_async_session() as session:
-            new_order = SalesOrder(customer_name=customer_name, user_id=user_id)
+            new_order = SalesOrder(
+                customer_name=customer_name,
+                user_id=user_id,
+                created_at=datetime.utcnow(),
+            )
             for item in items:
                 order_line = SalesOrderLine(
                     product_name=item['product_name'],
@@ -40,48 +75,350 @@ class DataService(DataServiceInterface):
                 )
                 new_order.items.append(order_line)
             session.add(new_order)
+            delta = SalesRollupDelta()
+            delta.add_order(
+                new_order.created_at,
+                [
+                    (item['product_name'], item['quantity'] * item['price'])
+                    for item in items
+                ]
+            )
+            await delta.apply(session)
+            # Sessions keep attributes after commit, so the lines appended
+            # above stay loaded; a refresh would expire them
             await session.commit()
-            await session.refresh(new_order)
-            await cache.invalidate(["get_sales_order"])
-            await cache.invalidate(["get_sales_orders"])
+            await cache.invalidate("get_sales_order", "get_all_sales_orders")
             app_logger.info("Sales order added", order_id=new_order.id, customer_name=customer_name)
             return new_order
 
+    async def _insert_orders(
+        self, session, orders: List[Dict], user_id: int
+    ) -> List[Dict]:
+        """Inserts orders and lines with multi-row INSERTs in the caller's session."""
+        id_rows = await session.execute(
+            select(func.nextval('sales_orders_id_seq'))
+            .select_from(func.generate_series(1, len(orders)))
+        )
+        order_ids = id_rows.scalars().all()
+        now = datetime.utcnow()
+        order_rows, line_rows, inserted = [], [], []
+        delta = SalesRollupDelta()
+        for order_id, order in zip(order_ids, orders):
+            created_at = order.get('created_at') or now
+            order_rows.append({
+                "id": order_id,
+                "customer_name": order['customer_name'],
+                "user_id": user_id,
+                "created_at": created_at,
+            })
+            lines = []
+            for item in order['items']:
+                line_rows.append({
+                    "sales_order_id": order_id,
+                    "product_name": item['product_name'],
+                    "quantity": item['quantity'],
+                    "price": item['price'],
+                })
+                lines.append((item['product_name'], item['quantity'] * item['price']))
+            delta.add_order(created_at, lines)
+            inserted.append({
+                "order_id": order_id,
+                "created_at": created_at,
+                "total": sum(amount for _, amount in lines),
+            })
+        await session.execute(insert(SalesOrder), order_rows)
+        if line_rows:
+            await session.execute(insert(SalesOrderLine), line_rows)
+        await delta.apply(session)
+        return inserted
+
+    @service_error_handler
+    async def add_sales_orders_bulk(
+        self, orders: List[Dict], user_id: int
+    ) -> Dict[str, List[Dict]]:
+        """Adds a chunk of sales orders in a single transaction.
+
+        If the chunk fails as a whole, each order is retried in its own
+        transaction so that only the offending rows are reported. Returns the
+        inserted orders and per-row errors, both keyed by position in ``orders``.
+        """
+        inserted, errors = [], []
+        try:
+            async with get_async_session() as session:
+                rows = await self._insert_orders(session, orders, user_id)
+                await session.commit()
+            inserted = [dict(row, index=index) for index, row in enumerate(rows)]
+        except Exception as e:
+            app_logger.warning(
+                "Bulk chunk failed, retrying row by row",
+                count=len(orders),
+                error=str(e),
+            )
+            for index, order in enumerate(orders):
+                try:
+                    async with get_async_session() as session:
+                        rows = await self._insert_orders(session, [order], user_id)
+                        await session.commit()
+                    inserted.append(dict(rows[0], index=index))
+                except Exception as row_error:
+                    errors.append({"index": index, "error": str(row_error)})
+        if inserted:
+            await cache.invalidate("get_sales_order", "get_all_sales_orders")
+        app_logger.info(
+            "Bulk sales orders added", inserted=len(inserted), failed=len(errors)
+        )
+        return {"orders": inserted, "errors": errors}
+
+    def _orders_query(self, load: LoadStrategy):
+        """Builds the base order query for a loading strategy.
+
+        Every strategy uses a fixed number of queries, however many orders match.
+        """
+        if load == LoadStrategy.TOTALS:
+            return (
+                select(
+                    SalesOrder.id,
+                    SalesOrder.customer_name,
+                    SalesOrder.created_at,
+                    func.coalesce(
+                        func.sum(SalesOrderLine.quantity * SalesOrderLine.price), 0.0
+                    ).label("total"),
+                    func.count(SalesOrderLine.id).label("line_count"),
+                )
+                .outerjoin(
+                    SalesOrderLine, SalesOrderLine.sales_order_id == SalesOrder.id
+                )
+                .group_by(SalesOrder.id)
+            )
+        if load == LoadStrategy.ORDERS_ONLY:
+            return select(SalesOrder).options(raiseload(SalesOrder.items))
+        return select(SalesOrder).options(selectinload(SalesOrder.items))
+
+    @staticmethod
+    def _rows(result, load: LoadStrategy) -> List[Union[SalesOrder, Dict]]:
+        if load == LoadStrategy.TOTALS:
+            return [dict(row._mapping) for row in result.all()]
+        return result.scalars().all()
+
     @service_error_handler
     @cache.cached(timeout=60)
-    async def get_sales_order(self, order_id: int) -> Optional[SalesOrder]:
+    async def get_sales_order(
+        self, order_id: int, load: LoadStrategy = LoadStrategy.ITEMS
+    ) -> Optional[Union[SalesOrder, Dict]]:
         """Retrieves a sales order by ID, with caching."""
         async with get_async_session() as session:
-            result = await session.execute(select(SalesOrder).where(SalesOrder.id == order_id))
-            order = result.scalars().first()
+            result = await session.execute(
+                self._orders_query(load).where(SalesOrder.id == order_id)
+            )
+            rows = self._rows(result, load)
+            order = rows[0] if rows else None
             if order:
-                app_logger.info("Sales order retrieved", order_id=order_id)
+                app_logger.info(
+                    "Sales order retrieved", sampled=True, order_id=order_id
+                )
             else:
                 app_logger.warning("Sales order not found", order_id=order_id)
             return order
 
     @service_error_handler
     @cache.cached(timeout=60)
-    async def get_all_sales_orders(self, limit: int = 10, offset: int = 0) -> List[SalesOrder]:
+    async def get_all_sales_orders(
+        self, limit: int = 10, offset: int = 0, load: LoadStrategy = LoadStrategy.ITEMS
+    ) -> List[Union[SalesOrder, Dict]]:
         """Retrieves all sales orders with pagination."""
         async with get_async_session() as session:
-            result = await session.execute(select(SalesOrder).offset(offset).limit(limit))
-            orders = result.scalars().all()
-            app_logger.info("Retrieved sales orders", count=len(orders))
+            result = await session.execute(
+                self._orders_query(load)
+                .order_by(SalesOrder.id)
+                .offset(offset)
+                .limit(limit)
+            )
+            orders = self._rows(result, load)
+            app_logger.info("Retrieved sales orders", sampled=True, count=len(orders))
             return orders
 
+    @service_error_handler
+    async def list_sales_orders(
+        self, limit: int = 10, cursor: Optional[str] = None
+    ) -> Dict:
+        """Lists sales orders newest first using (created_at, id) keyset pagination.
+
+        Returns the page of orders with their totals and an opaque ``next_cursor``
+        (None on the last page). Each page costs the same regardless of depth.
+        """
+        page = (
+            select(SalesOrder.id, SalesOrder.customer_name, SalesOrder.created_at)
+            .order_by(SalesOrder.created_at.desc(), SalesOrder.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            position = tuple_(*decode_cursor(cursor))
+            page = page.where(tuple_(SalesOrder.created_at, SalesOrder.id) < position)
+        page = page.subquery()
+        query = (
+            select(
+                page.c.id,
+                page.c.customer_name,
+                page.c.created_at,
+                func.coalesce(
+                    func.sum(SalesOrderLine.quantity * SalesOrderLine.price), 0.0
+                ),
+            )
+            .outerjoin(SalesOrderLine, SalesOrderLine.sales_order_id == page.c.id)
+            .group_by(page.c.id, page.c.customer_name, page.c.created_at)
+            .order_by(page.c.created_at.desc(), page.c.id.desc())
+        )
+        async with get_async_session() as session:
+            result = await session.execute(query)
+            rows = result.all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        orders = [
+            {
+                "id": order_id,
+                "customer_name": customer_name,
+                "created_at": created_at.isoformat(),
+                "total": total,
+            }
+            for order_id, customer_name, created_at, total in rows
+        ]
+        return {"orders": orders, "next_cursor": next_cursor}
+
+    @service_error_handler
+    async def get_daily_order_totals(self) -> List[Tuple[date, float, int]]:
+        """Retrieves (day, total, order count) for every day with orders."""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(
+                    DailySalesRollup.day,
+                    DailySalesRollup.total,
+                    DailySalesRollup.order_count,
+                )
+                .where(DailySalesRollup.order_count > 0)
+                .order_by(DailySalesRollup.day)
+            )
+            return result.all()
+
+    @service_error_handler
+    async def get_customer_features(self) -> List[Tuple[str, float, int]]:
+        """Retrieves (customer_name, total spend, line count) for every customer."""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(
+                    SalesOrder.customer_name,
+                    func.sum(SalesOrderLine.quantity * SalesOrderLine.price),
+                    func.count(SalesOrderLine.id),
+                )
+                .join(SalesOrderLine, SalesOrderLine.sales_order_id == SalesOrder.id)
+                .group_by(SalesOrder.customer_name)
+            )
+            return result.all()
+
     @service_error_handler
     async def delete_sales_order(self, order_id: int) -> bool:
         """Deletes a sales order by ID."""
         async with get_async_session() as session:
-            result = await session.execute(select(SalesOrder).where(SalesOrder.id == order_id))
+            result = await session.execute(
+                select(SalesOrder)
+                .options(selectinload(SalesOrder.items))
+                .where(SalesOrder.id == order_id)
+            )
             order = result.scalars().first()
             if order:
+                delta = SalesRollupDelta()
+                delta.add_order(
+                    order.created_at,
+                    [
+                        (line.product_name, line.quantity * line.price)
+                        for line in order.items
+                    ],
+                    sign=-1,
+                )
+                await delta.apply(session)
                 await session.delete(order)
                 await session.commit()
-                await cache.invalidate(["get_sales_order", str(order_id)])
+                await cache.invalidate("get_sales_order", "get_all_sales_orders")
                 app_logger.info("Sales order deleted", order_id=order_id)
                 return True
             else:
                 app_logger.warning("Sales order to delete not found", order_id=order_id)
                 return False
+
+    @service_error_handler
+    async def get_sales_trend(self, start: date, end: date) -> Dict[str, List]:
+        """Retrieves per-day sales totals for [start, end] from the daily rollup.
+
+        Raises ValueError for spans longer than ``SALES_TREND_MAX_DAYS``.
+        """
+        if (end - start).days + 1 > settings.SALES_TREND_MAX_DAYS:
+            raise ValueError(
+                f"Sales trend spans at most {settings.SALES_TREND_MAX_DAYS} days"
+            )
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(
+                    DailySalesRollup.day,
+                    DailySalesRollup.total,
+                    DailySalesRollup.order_count,
+                    DailySalesRollup.line_count,
+                )
+                .where(DailySalesRollup.day >= start, DailySalesRollup.day <= end)
+            )
+            rows = result.all()
+        return trend_series(start, end, rows)
+
+    @service_error_handler
+    async def get_sales_heatmap(
+        self,
+        as_of: date,
+        weeks: Optional[int] = None,
+        product_name: Optional[str] = None,
+    ) -> Dict[str, List]:
+        """Retrieves weekday x hour sales by combining weekly slices up to ``as_of``."""
+        last_week = week_start(as_of)
+        query = (
+            select(
+                WeeklySalesHeatmapCell.weekday,
+                WeeklySalesHeatmapCell.hour,
+                func.sum(WeeklySalesHeatmapCell.total),
+            )
+            .where(WeeklySalesHeatmapCell.week_start <= last_week)
+            .group_by(WeeklySalesHeatmapCell.weekday, WeeklySalesHeatmapCell.hour)
+        )
+        if weeks is not None:
+            first_week = last_week - timedelta(weeks=weeks)
+            query = query.where(WeeklySalesHeatmapCell.week_start > first_week)
+        if product_name is not None:
+            query = query.where(WeeklySalesHeatmapCell.product_name == product_name)
+        async with get_async_session() as session:
+            result = await session.execute(query)
+            matrix = heatmap_matrix(result.all())
+        return {
+            "weekdays": WEEKDAYS,
+            "hours": list(range(24)),
+            "matrix": matrix.tolist(),
+            "values": [
+                {"x": hour, "y": weekday, "v": float(matrix[weekday, hour])}
+                for weekday in range(7) for hour in range(24)
+            ],
+        }
+
+    @service_error_handler
+    async def rebuild_sales_rollup(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Tuple[int, int]:
+        """Recomputes the rollup and heatmap from raw orders, e.g. after a backfill."""
+        async with get_async_session() as session:
+            days = await rebuild_rollup(session, start, end)
+            cells = await rebuild_heatmap(session, start, end)
+            await session.commit()
+            app_logger.info(
+                "Sales rollup rebuilt",
+                start=str(start),
+                end=str(end),
+                days=days,
+                cells=cells,
+            )
+            return days, cells
@@ -1,8 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Union
+from datetime import date
+from enum import Enum
 from models.sales_order import SalesOrder
 
 
+class LoadStrategy(str, Enum):
+    """How order lines are loaded by DataService read methods."""
+
+    ITEMS = "items"  # SalesOrder objects with items eagerly loaded via selectinload
+    ORDERS_ONLY = "orders_only"  # SalesOrder objects; touching items raises
+    TOTALS = "totals"  # Plain dicts with totals and line counts, no ORM objects
+
+
 class DataServiceInterface(ABC):
     """Abstract base class for data services."""
 
@@ -11,13 +21,50 @@ class DataServiceInterface(ABC):
         pass
 
     @abstractmethod
-    async def get_sales_order(self, order_id: int) -> Optional[SalesOrder]:
+    async def add_sales_orders_bulk(
+        self, orders: List[Dict], user_id: int
+    ) -> Dict[str, List[Dict]]:
+        pass
+
+    @abstractmethod
+    async def get_sales_order(
+        self, order_id: int, load: LoadStrategy = LoadStrategy.ITEMS
+    ) -> Optional[Union[SalesOrder, Dict]]:
         pass
 
     @abstractmethod
-    async def get_all_sales_orders(self, limit: int = 10, offset: int = 0) -> List[SalesOrder]:
+    async def get_all_sales_orders(
+        self, limit: int = 10, offset: int = 0, load: LoadStrategy = LoadStrategy.ITEMS
+    ) -> List[Union[SalesOrder, Dict]]:
+        pass
+
+    @abstractmethod
+    async def list_sales_orders(
+        self, limit: int = 10, cursor: Optional[str] = None
+    ) -> Dict:
+        pass
+
+    @abstractmethod
+    async def get_daily_order_totals(self) -> List[Tuple[date, float, int]]:
+        pass
+
+    @abstractmethod
+    async def get_customer_features(self) -> List[Tuple[str, float, int]]:
         pass
 
     @abstractmethod
     async def delete_sales_order(self, order_id: int) -> bool:
         pass
+
+    @abstractmethod
+    async def get_sales_trend(self, start: date, end: date) -> Dict[str, List]:
+        pass
+
+    @abstractmethod
+    async def get_sales_heatmap(
+        self,
+        as_of: date,
+        weeks: Optional[int] = None,
+        product_name: Optional[str] = None,
+    ) -> Dict[str, List]:
+        pass
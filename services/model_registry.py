@@ -0,0 +1,138 @@
+import fcntl
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import joblib
+from config.settings import settings
+from utils.logger import app_logger
+
+ARTIFACT_FILE = "artifact.joblib"
+METADATA_FILE = "metadata.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = f"{CURRENT_FILE}.lock"
+
+
+class ModelRegistry:
+    """Versioned model artifacts on disk, shared by every worker.
+
+    Each model name is a directory of numbered versions plus a ``CURRENT``
+    pointer::
+
+        <root>/sales_forecast/000003/artifact.joblib
+        <root>/sales_forecast/000003/metadata.json
+        <root>/sales_forecast/CURRENT          -> "000003"
+
+    A version is written into a temporary directory and renamed into place,
+    and ``CURRENT`` is replaced atomically, so readers only ever see complete
+    versions. ``CURRENT`` only moves forward, so a publisher that finishes
+    late never rolls it back to an older version. Artifacts are uncompressed
+    so they can be loaded with ``mmap_mode`` and their arrays shared between
+    worker processes.
+    """
+
+    def __init__(self, root: Optional[str] = None, keep_versions: Optional[int] = None):
+        self.root = root or os.path.join(settings.AI_MODELS_PATH, "registry")
+        self.keep_versions = keep_versions or settings.AI_MODEL_KEEP_VERSIONS
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def versions(self, name: str) -> List[str]:
+        """Lists complete versions of ``name``, oldest first."""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(entry for entry in os.listdir(model_dir) if entry.isdigit())
+
+    def current_version(self, name: str) -> Optional[str]:
+        """Returns the version ``CURRENT`` points at, if any."""
+        try:
+            with open(os.path.join(self._model_dir(name), CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, name: str, artifact: Any, metadata: Optional[Dict] = None) -> str:
+        """Stores ``artifact`` as a new version, makes it current and returns it."""
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        staging = os.path.join(model_dir, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            with open(os.path.join(staging, ARTIFACT_FILE), "wb") as f:
+                joblib.dump(artifact, f)
+                f.flush()
+                os.fsync(f.fileno())
+            while True:
+                existing = self.versions(name)
+                version = f"{int(existing[-1]) + 1 if existing else 1:06d}"
+                meta = dict(
+                    metadata or {},
+                    name=name,
+                    version=version,
+                    created_at=datetime.utcnow().isoformat(),
+                )
+                with open(os.path.join(staging, METADATA_FILE), "w") as f:
+                    json.dump(meta, f, default=str)
+                try:
+                    # Fails if another worker published this version first; try the next
+                    os.rename(staging, os.path.join(model_dir, version))
+                    break
+                except OSError:
+                    if not os.path.isdir(os.path.join(model_dir, version)):
+                        raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._set_current(name, version)
+        self.prune(name)
+        app_logger.info("Model version published", model=name, version=version)
+        return version
+
+    def _set_current(self, name: str, version: str):
+        """Points ``CURRENT`` at ``version`` unless it already names a newer one."""
+        model_dir = self._model_dir(name)
+        # The lock spans reading and replacing CURRENT across worker processes
+        with open(os.path.join(model_dir, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self.current_version(name)
+            if current is not None and int(current) >= int(version):
+                return
+            pointer = os.path.join(model_dir, f".{CURRENT_FILE}-{uuid.uuid4().hex}")
+            with open(pointer, "w") as f:
+                f.write(version)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(pointer, os.path.join(model_dir, CURRENT_FILE))
+
+    def load(
+        self, name: str, version: Optional[str] = None, mmap_mode: Optional[str] = "r"
+    ) -> Tuple[Any, Dict]:
+        """Loads (artifact, metadata) for ``version``, or the current version.
+
+        With ``mmap_mode="r"`` arrays are read-only views of the file; use
+        ``"c"`` (copy-on-write) for artifacts that are updated in place.
+        """
+        version = version or self.current_version(name)
+        if version is None:
+            raise FileNotFoundError(f"No published version of model {name}")
+        version_dir = os.path.join(self._model_dir(name), version)
+        artifact = joblib.load(
+            os.path.join(version_dir, ARTIFACT_FILE), mmap_mode=mmap_mode
+        )
+        with open(os.path.join(version_dir, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        return artifact, metadata
+
+    def prune(self, name: str):
+        """Deletes all but the newest ``keep_versions`` versions, never the current."""
+        current = self.current_version(name)
+        for version in self.versions(name)[:-self.keep_versions]:
+            if version != current:
+                # Workers that still map the old files keep them until they unmap
+                shutil.rmtree(
+                    os.path.join(self._model_dir(name), version), ignore_errors=True
+                )
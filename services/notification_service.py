@@ -1,42 +1,144 @@
 import asyncio
 import aiosmtplib
+from datetime import datetime
 from email.mime.text import MIMEText
+from typing import List, Optional, Tuple
 from config.settings import settings
 from utils.logger import app_logger
 
 
 class NotificationService:
-    """Asynchronous service for sending notifications."""
+    """Asynchronous service for sending notifications.
+
+    Anomaly alerts are queued and sent by a background dispatcher that
+    coalesces bursts into one digest per ``ALERT_DIGEST_WINDOW_MS`` window
+    over a single long-lived SMTP connection.
+    """
 
     def __init__(self):
         self.smtp_server = settings.EMAIL_SMTP_SERVER
         self.smtp_port = settings.EMAIL_SMTP_PORT
+        self.use_tls = settings.EMAIL_USE_TLS
         self.username = settings.EMAIL_USERNAME
         self.password = settings.EMAIL_PASSWORD
         self.recipients = settings.NOTIFICATION_RECIPIENTS
+        self.digest_window = settings.ALERT_DIGEST_WINDOW_MS / 1000
+        self.alert_queue: asyncio.Queue = asyncio.Queue(
+            maxsize=settings.ALERT_QUEUE_MAX
+        )
+        self.dropped_alerts = 0
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._smtp_lock = asyncio.Lock()
+
+    def start(self):
+        """Starts the background alert dispatcher if it is not running."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_alerts())
 
     async def send_anomaly_alert(self, value: float):
-        """Sends an email alert when an anomaly is detected."""
-        subject = "Anomaly Detected in Sales Data"
-        body = f"An anomaly was detected in sales data. Detected value: {value}"
-        await self.send_email(subject, body)
+        """Queues an anomaly alert without waiting on SMTP."""
+        self.start()
+        try:
+            self.alert_queue.put_nowait((value, datetime.utcnow()))
+        except asyncio.QueueFull:
+            self.dropped_alerts += 1
+            app_logger.warning("Alert queue full, dropping alert", value=value)
+
+    async def _dispatch_alerts(self):
+        while True:
+            alerts = [await self.alert_queue.get()]
+            try:
+                await asyncio.sleep(self.digest_window)
+            finally:
+                alerts.extend(self._drain_alerts())
+                subject, body = self.build_digest(alerts)
+                # Shielded so a shutdown cancel still delivers alerts already dequeued
+                await asyncio.shield(self.send_email(subject, body))
+
+    def _drain_alerts(self) -> List[Tuple[float, datetime]]:
+        alerts = []
+        while not self.alert_queue.empty():
+            alerts.append(self.alert_queue.get_nowait())
+        return alerts
+
+    def build_digest(self, alerts: List[Tuple[float, datetime]]) -> Tuple[str, str]:
+        """Builds the subject and body for one or more coalesced alerts."""
+        if len(alerts) == 1:
+            value, _ = alerts[0]
+            subject = "Anomaly Detected in Sales Data"
+            body = f"An anomaly was detected in sales data. Detected value: {value}"
+            return subject, body
+        subject = f"{len(alerts)} Anomalies Detected in Sales Data"
+        lines = [f"{len(alerts)} anomalies were detected in sales data:", ""]
+        lines += [
+            f"{detected_at.isoformat()}  value: {value}"
+            for value, detected_at in alerts
+        ]
+        return subject, "\n".join(lines)
+
+    async def _get_smtp(self) -> aiosmtplib.SMTP:
+        """Returns the shared SMTP connection, reconnecting if it has dropped."""
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+        smtp = aiosmtplib.SMTP(
+            hostname=self.smtp_server, port=self.smtp_port, use_tls=self.use_tls
+        )
+        await smtp.connect()
+        self._smtp = smtp
+        if self.password:
+            await smtp.login(self.username, self.password)
+        return smtp
+
+    def _discard_smtp(self):
+        """Drops the shared connection, closing its socket; errors are ignored."""
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
 
     async def send_email(self, subject: str, body: str):
-        """Sends an email using asynchronous SMTP."""
+        """Sends an email over the persistent SMTP connection."""
         message = MIMEText(body)
         message['Subject'] = subject
         message['From'] = self.username
         message['To'] = ", ".join(self.recipients)
 
-        try:
-            await aiosmtplib.send(
-                message,
-                hostname=self.smtp_server,
-                port=self.smtp_port,
-                use_tls=True,
-                username=self.username,
-                password=self.password,
-            )
-            app_logger.info("Email notification sent", subject=subject)
-        except Exception as e:
-            app_logger.error("Failed to send email", error=str(e))
+        async with self._smtp_lock:
+            for attempt in range(2):
+                try:
+                    smtp = await self._get_smtp()
+                    await smtp.send_message(message)
+                    app_logger.info("Email notification sent", subject=subject)
+                    return
+                except aiosmtplib.SMTPServerDisconnected as e:
+                    # Stale connection: reconnect once before giving up
+                    self._discard_smtp()
+                    error = e
+                except Exception as e:
+                    self._discard_smtp()
+                    error = e
+                    break
+            app_logger.error("Failed to send email", error=str(error))
+
+    async def close(self):
+        """Sends any pending alerts and closes the SMTP connection."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        pending = self._drain_alerts()
+        if pending:
+            await self.send_email(*self.build_digest(pending))
+        async with self._smtp_lock:
+            if self._smtp is not None and self._smtp.is_connected:
+                try:
+                    await self._smtp.quit()
+                except aiosmtplib.SMTPException:
+                    self._smtp.close()
+            self._smtp = None
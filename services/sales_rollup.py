@@ -0,0 +1,243 @@
+"""Sales rollup maintenance.
+
+The ``daily_sales_rollup`` and ``weekly_sales_heatmap`` tables are kept
+current by ``DataService`` on every order insert and delete. Run this module
+to rebuild them after backfills::
+
+    python -m services.sales_rollup --start 2023-01-01 --end 2023-12-31
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Date, Integer, cast, delete, distinct, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.sales_order import SalesOrder, SalesOrderLine
+from models.sales_rollup import DailySalesRollup, WeeklySalesHeatmapCell
+
+# asyncpg rejects statements with more bind parameters than this
+MAX_QUERY_PARAMETERS = 32767
+
+WEEKDAYS = [
+    "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"
+]
+
+
+def week_start(day: date) -> date:
+    """Returns the Monday of the week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+async def rebuild_rollup(
+    session: AsyncSession, start: Optional[date] = None, end: Optional[date] = None
+):
+    """Recomputes rollup rows for [start, end] from the raw order tables."""
+    day = cast(SalesOrder.created_at, Date)
+    source = (
+        select(
+            day,
+            func.coalesce(
+                func.sum(SalesOrderLine.quantity * SalesOrderLine.price), 0.0
+            ),
+            func.count(distinct(SalesOrder.id)),
+            func.count(SalesOrderLine.id),
+        )
+        .select_from(SalesOrder)
+        .outerjoin(SalesOrderLine, SalesOrderLine.sales_order_id == SalesOrder.id)
+        .group_by(day)
+    )
+    clear = delete(DailySalesRollup)
+    if start is not None:
+        source = source.where(day >= start)
+        clear = clear.where(DailySalesRollup.day >= start)
+    if end is not None:
+        source = source.where(day <= end)
+        clear = clear.where(DailySalesRollup.day <= end)
+    await session.execute(clear)
+    result = await session.execute(
+        insert(DailySalesRollup).from_select(
+            ["day", "total", "order_count", "line_count"], source
+        )
+    )
+    return result.rowcount
+
+
+class SalesRollupDelta:
+    """Accumulates rollup and heatmap changes for one or more orders.
+
+    Changes are merged per day and per heatmap cell, so applying them costs
+    one multi-row upsert per table however many orders were added.
+    """
+
+    def __init__(self):
+        self.days: Dict[date, list] = defaultdict(lambda: [0.0, 0, 0])
+        self.cells: Dict[Tuple[date, str, int, int], list] = defaultdict(
+            lambda: [0.0, 0]
+        )
+
+    def add_order(
+        self, created_at: datetime, lines: Iterable[Tuple[str, float]], sign: int = 1
+    ):
+        """Adds (sign=1) or subtracts (sign=-1) an order's (product, amount) lines."""
+        day = self.days[created_at.date()]
+        day[1] += sign
+        week = week_start(created_at.date())
+        for product_name, amount in lines:
+            day[0] += sign * amount
+            day[2] += sign
+            key = (week, product_name, created_at.weekday(), created_at.hour)
+            cell = self.cells[key]
+            cell[0] += sign * amount
+            cell[1] += sign
+
+    async def apply(self, session: AsyncSession):
+        """Upserts the accumulated changes within the caller's transaction."""
+        day_rows = [
+            {"day": day, "total": total, "order_count": orders, "line_count": lines}
+            for day, (total, orders, lines) in self.days.items()
+        ]
+        for rows in _parameter_slices(day_rows):
+            stmt = insert(DailySalesRollup).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DailySalesRollup.day],
+                set_={
+                    "total": DailySalesRollup.total + stmt.excluded.total,
+                    "order_count": (
+                        DailySalesRollup.order_count + stmt.excluded.order_count
+                    ),
+                    "line_count": (
+                        DailySalesRollup.line_count + stmt.excluded.line_count
+                    ),
+                },
+            )
+            await session.execute(stmt)
+        cell_rows = [
+            {
+                "week_start": week,
+                "product_name": product_name,
+                "weekday": weekday,
+                "hour": hour,
+                "total": total,
+                "line_count": lines,
+            }
+            for (week, product_name, weekday, hour), (total, lines)
+            in self.cells.items()
+        ]
+        for rows in _parameter_slices(cell_rows):
+            stmt = insert(WeeklySalesHeatmapCell).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[
+                    WeeklySalesHeatmapCell.week_start,
+                    WeeklySalesHeatmapCell.product_name,
+                    WeeklySalesHeatmapCell.weekday,
+                    WeeklySalesHeatmapCell.hour,
+                ],
+                set_={
+                    "total": WeeklySalesHeatmapCell.total + stmt.excluded.total,
+                    "line_count": (
+                        WeeklySalesHeatmapCell.line_count + stmt.excluded.line_count
+                    ),
+                },
+            )
+            await session.execute(stmt)
+
+
+def _parameter_slices(rows: List[Dict]) -> Iterator[List[Dict]]:
+    """Splits multi-row VALUES rows so no statement exceeds the bind parameter limit."""
+    if not rows:
+        return
+    size = MAX_QUERY_PARAMETERS // len(rows[0])
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+async def rebuild_heatmap(
+    session: AsyncSession, start: Optional[date] = None, end: Optional[date] = None
+):
+    """Recomputes heatmap weeks overlapping [start, end] from the raw order tables."""
+    week = cast(func.date_trunc('week', SalesOrder.created_at), Date)
+    weekday = cast(func.extract('isodow', SalesOrder.created_at) - 1, Integer)
+    hour = cast(func.extract('hour', SalesOrder.created_at), Integer)
+    source = (
+        select(
+            week,
+            SalesOrderLine.product_name,
+            weekday,
+            hour,
+            func.sum(SalesOrderLine.quantity * SalesOrderLine.price),
+            func.count(SalesOrderLine.id),
+        )
+        .select_from(SalesOrder)
+        .join(SalesOrderLine, SalesOrderLine.sales_order_id == SalesOrder.id)
+        .group_by(week, SalesOrderLine.product_name, weekday, hour)
+    )
+    clear = delete(WeeklySalesHeatmapCell)
+    # Whole weeks are rebuilt so partially covered weeks stay consistent
+    if start is not None:
+        source = source.where(week >= week_start(start))
+        clear = clear.where(WeeklySalesHeatmapCell.week_start >= week_start(start))
+    if end is not None:
+        source = source.where(week <= week_start(end))
+        clear = clear.where(WeeklySalesHeatmapCell.week_start <= week_start(end))
+    await session.execute(clear)
+    result = await session.execute(
+        insert(WeeklySalesHeatmapCell).from_select(
+            ["week_start", "product_name", "weekday", "hour", "total", "line_count"],
+            source,
+        )
+    )
+    return result.rowcount
+
+
+def trend_series(start: date, end: date, rows) -> Dict[str, List]:
+    """Zero-fills (day, total, order_count, line_count) rows over [start, end]."""
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    sales = np.zeros(days.size)
+    order_counts = np.zeros(days.size, dtype=np.int64)
+    line_counts = np.zeros(days.size, dtype=np.int64)
+    if rows:
+        row_days, totals, orders, lines = zip(*rows)
+        index = (np.array(row_days, dtype='datetime64[D]') - days[0]).astype(np.int64)
+        sales[index] = totals
+        order_counts[index] = orders
+        line_counts[index] = lines
+    return {
+        "dates": np.datetime_as_string(days).tolist(),
+        "sales": sales.tolist(),
+        "order_counts": order_counts.tolist(),
+        "line_counts": line_counts.tolist(),
+    }
+
+
+def heatmap_matrix(cells) -> np.ndarray:
+    """Packs (weekday, hour, total) rows into a dense 7 x 24 array."""
+    matrix = np.zeros((7, 24))
+    cells = np.asarray(cells, dtype=float).reshape(-1, 3)
+    np.add.at(matrix, (cells[:, 0].astype(int), cells[:, 1].astype(int)), cells[:, 2])
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the sales rollup and heatmap tables."
+    )
+    parser.add_argument(
+        "--start", type=date.fromisoformat, default=None, help="First day (YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--end", type=date.fromisoformat, default=None, help="Last day (YYYY-MM-DD)"
+    )
+    args = parser.parse_args()
+
+    from services.data_service import DataService
+
+    days, cells = asyncio.run(DataService().rebuild_sales_rollup(args.start, args.end))
+    print(f"Rebuilt {days} rollup day(s) and {cells} heatmap cell(s)")
+
+
+if __name__ == "__main__":
+    main()
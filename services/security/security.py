@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
 from config.settings import settings
 
@@ -10,3 +12,45 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed_password: str) -> bool:
     """Verifies a password against a hashed password."""
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many password operations are already waiting."""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL, so a login storm occupies at most ``workers``
+    threads while the event loop keeps serving other requests. At most
+    ``max_pending`` operations may be running or queued; beyond that
+    callers get PasswordQueueFull instead of waiting without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordQueueFull(f"{self.pending} password operations pending")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_MAX
+)
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Set
+from config.settings import settings
+from services.ai_insights import AIInsights, CUSTOMER_SEGMENTATION, SALES_FORECAST
+from services.cache_service import RELEASE_LOCK_SCRIPT
+from utils.logger import app_logger
+from utils.redis_pool import get_redis
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Hands the active-job key over only if it still names the job being replaced
+TAKE_OVER_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
+
+
+class TrainingJobs:
+    """Runs model training as background jobs whose status is kept in Redis.
+
+    Any worker can report on a job, whichever worker runs it. Only one job
+    per model runs at a time; submitting while one is active returns it.
+    The trained version reaches other workers through the model registry.
+    """
+
+    def __init__(self, ai_insights: AIInsights, redis=None):
+        self.ai_insights = ai_insights
+        self.trainers = {
+            SALES_FORECAST: ai_insights.train_sales_forecast_model,
+            CUSTOMER_SEGMENTATION: ai_insights.train_customer_segmentation_model,
+        }
+        self.prefix = f"{settings.CACHE_NAMESPACE}:training_jobs"
+        self._redis = redis
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _client(self):
+        if self._redis is not None:
+            return self._redis
+        return await get_redis()
+
+    async def _save(self, job: Dict):
+        redis = await self._client()
+        await redis.set(
+            f"{self.prefix}:{job['id']}",
+            json.dumps(job),
+            expire=settings.AI_TRAINING_JOB_TTL,
+        )
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Returns a job's current state, or None if it is unknown or expired."""
+        redis = await self._client()
+        data = await redis.get(f"{self.prefix}:{job_id}")
+        return json.loads(data) if data is not None else None
+
+    async def submit(self, model: str) -> Dict:
+        """Starts a training job for ``model`` unless one is already active."""
+        if model not in self.trainers:
+            raise ValueError(f"Unknown model: {model}")
+        redis = await self._client()
+        job = {
+            "id": uuid.uuid4().hex,
+            "model": model,
+            "status": PENDING,
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "version": None,
+            "error": None,
+        }
+        active_key = f"{self.prefix}:active:{model}"
+        timeout = settings.AI_TRAINING_JOB_TIMEOUT
+        # Saved first, so a job named by the active key always has a record
+        await self._save(job)
+        while not await redis.set(
+            active_key, job["id"], expire=timeout, exist=redis.SET_IF_NOT_EXIST
+        ):
+            active_id = await redis.get(active_key)
+            if active_id is None:
+                continue
+            active = await self.get(active_id.decode('utf-8'))
+            if active is not None and active["status"] in (PENDING, RUNNING):
+                await redis.delete(f"{self.prefix}:{job['id']}")
+                return active
+            # The active job expired or finished; replace it unless another caller did
+            taken = await redis.eval(
+                TAKE_OVER_SCRIPT,
+                keys=[active_key],
+                args=[active_id, job["id"], timeout],
+            )
+            if taken:
+                break
+        task = asyncio.create_task(self._run(job, active_key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        app_logger.info("Training job submitted", job_id=job["id"], model=model)
+        return job
+
+    async def _run(self, job: Dict, active_key: str):
+        job.update(status=RUNNING, started_at=datetime.utcnow().isoformat())
+        await self._save(job)
+        try:
+            version = await self.trainers[job["model"]]()
+            if version is None:
+                job.update(status=FAILED, error="No data available for training")
+            else:
+                job.update(status=SUCCEEDED, version=version)
+        except asyncio.CancelledError:
+            job.update(status=FAILED, error="Worker shut down before training finished")
+            raise
+        except Exception as e:
+            app_logger.error(
+                "Training job failed",
+                job_id=job["id"],
+                model=job["model"],
+                error=str(e),
+            )
+            job.update(status=FAILED, error=str(e))
+        finally:
+            job["finished_at"] = datetime.utcnow().isoformat()
+            await self._save(job)
+            redis = await self._client()
+            # The key may have timed out and been taken over by a newer job
+            await redis.eval(RELEASE_LOCK_SCRIPT, keys=[active_key], args=[job["id"]])
+            app_logger.info(
+                "Training job finished", job_id=job["id"], status=job["status"]
+            )
+
+    async def close(self):
+        """Cancels jobs still running in this worker."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
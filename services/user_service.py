@@ -1,7 +1,8 @@
+from typing import List
 from models.user import User
 from utils.permissions import VALID_PERMISSIONS
 from utils.async_db import get_async_session
-from services.security.security import hash_password
+from services.security.security import password_hasher
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from utils.logger import app_logger
@@ -13,7 +14,7 @@ class UserService:
     async def create_user(self, username: str, password: str, role: str, permissions: List[str]) -> User:
         """Creates a new user with validated permissions."""
         sanitized_permissions = [perm for perm in permissions if perm in VALID_PERMISSIONS]
-        hashed_password = hash_password(password)
+        hashed_password = await password_hasher.hash(password)
         new_user = User(
             username=username,
             hashed_password=hashed_password,
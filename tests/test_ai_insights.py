@@ -1,8 +1,16 @@
 import pytest
-from services.ai_insights import AIInsights
+from services.ai_insights import (
+    AIInsights, ModelNotTrainedError, forecast_dates, forecast_points,
+)
+from services.model_registry import ModelRegistry
 from services.data_service import DataService
 from unittest.mock import AsyncMock, patch
 from pandas import DataFrame
+from datetime import date, datetime, timedelta
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LinearRegression
+from utils.running_stats import RunningLinearRegression
+import numpy as np
 
 @pytest.mark.asyncio
 async def test_predict_sales():
@@ -21,19 +29,201 @@ async def test_predict_sales():
 async def test_segment_customers():
     ai_insights = AIInsights()
 
-    # Mock the training method
+    # Inference runs in the process pool, so the model must be picklable
+    ai_insights.scaler.fit([[100.0, 1], [100.0, 2]])
+    ai_insights.kmeans_model = KMeans(n_clusters=2, random_state=42, n_init=10).fit(
+        ai_insights.scaler.transform([[100.0, 1], [100.0, 2]])
+    )
+
+    # Mock data_service to return aggregated customer features
+    ai_insights.data_service.get_customer_features = AsyncMock(return_value=[
+        ("Customer A", 100.0, 1),
+        ("Customer B", 100.0, 2),
+    ])
+
+    segments = await ai_insights.segment_customers()
+    assert isinstance(segments, DataFrame)
+    assert not segments.empty
+    assert sorted(segments['segment']) == [0, 1]
+    await ai_insights.close()
+
+@pytest.mark.asyncio
+async def test_segment_customers_without_customers():
+    ai_insights = AIInsights(registry=ModelRegistry(root="/nonexistent-registry"))
+    ai_insights.kmeans_model = KMeans(n_clusters=2, n_init=10)
+    ai_insights.data_service.get_customer_features = AsyncMock(return_value=[])
+    ai_insights.run_in_pool = AsyncMock()
+
+    segments = await ai_insights.segment_customers()
+    assert segments.empty
+    assert 'segment' in segments.columns
+    ai_insights.run_in_pool.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_segment_customers_never_trains_inline():
+    ai_insights = AIInsights(registry=ModelRegistry(root="/nonexistent-registry"))
+    ai_insights.kmeans_model = None
     ai_insights.train_customer_segmentation_model = AsyncMock()
-    ai_insights.kmeans_model = AsyncMock()
-    ai_insights.kmeans_model.predict = lambda x: [0, 1]
 
-    # Mock data_service to return test orders
-    test_orders = [
-        AsyncMock(customer_name="Customer A", items=[AsyncMock(quantity=1, price=100.0)]),
-        AsyncMock(customer_name="Customer B", items=[AsyncMock(quantity=2, price=50.0)])
+    with pytest.raises(ModelNotTrainedError):
+        await ai_insights.segment_customers()
+    ai_insights.train_customer_segmentation_model.assert_not_called()
+
+def test_running_linear_regression_matches_batch_fit():
+    rng = np.random.default_rng(42)
+    X = rng.integers(738000, 739000, size=(300, 1)).astype(float)
+    y = 3.5 * X[:, 0] - 2_000_000 + rng.normal(0, 50, size=300)
+
+    stats = RunningLinearRegression()
+    stats.update_batch(X[:100], y[:100])
+    for x_row, y_value in zip(X[100:], y[100:]):
+        stats.update(x_row, y_value)
+    stats.update([738500.0], 1e9)
+    stats.remove([738500.0], 1e9)
+
+    coef, intercept = stats.coefficients()
+    reference = LinearRegression().fit(X, y)
+    assert coef == pytest.approx(reference.coef_)
+    assert intercept == pytest.approx(reference.intercept_)
+
+@pytest.mark.asyncio
+async def test_train_and_record_sales_orders():
+    ai_insights = AIInsights()
+    ai_insights.save_model = lambda model, path: None
+    start = datetime(2023, 1, 1)
+    ai_insights.data_service.get_daily_order_totals = AsyncMock(return_value=[
+        ((start + timedelta(days=i)).date(), 100.0 + 10 * i, 1) for i in range(10)
+    ])
+
+    await ai_insights.train_sales_forecast_model()
+    assert ai_insights.predict_sales(["2023-01-11"]) == pytest.approx([200.0])
+
+    ai_insights.record_sales_order(start + timedelta(days=10), 200.0)
+    assert ai_insights.sales_stats.count == 11
+    assert ai_insights.predict_sales(["2023-01-12"]) == pytest.approx([210.0])
+
+@pytest.mark.asyncio
+async def test_refresh_matches_batch_refit_after_reload(tmp_path):
+    rng = np.random.default_rng(7)
+    start = datetime(2023, 1, 1)
+    offsets = rng.integers(0, 60, size=200)
+    created_ats = [start + timedelta(days=int(d), hours=9) for d in offsets]
+    totals = rng.normal(500, 80, size=200) + 3 * offsets
+
+    def rollup(count):
+        days = {}
+        for created_at, total in zip(created_ats[:count], totals[:count]):
+            day_total, orders = days.get(created_at.date(), (0.0, 0))
+            days[created_at.date()] = (day_total + total, orders + 1)
+        return [(day, total, orders) for day, (total, orders) in sorted(days.items())]
+
+    def batch_refit(count):
+        X = [[created_at.toordinal()] for created_at in created_ats[:count]]
+        return LinearRegression().fit(X, totals[:count])
+
+    trainer = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    trainer.data_service.get_daily_order_totals = AsyncMock(return_value=rollup(100))
+    await trainer.train_sales_forecast_model()
+    await trainer.close()
+
+    # A worker folds in orders locally, then a reload replaces its statistics
+    worker = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    worker.record_sales_orders(created_ats[100:150], totals[100:150].tolist())
+    assert worker.sales_stats.count == 150
+    artifact, _ = trainer.registry.load("sales_forecast")
+    worker.install_model("sales_forecast", "000001", artifact)
+    assert worker.sales_stats.count == 100
+
+    # The rollup also holds the orders other workers committed
+    worker.data_service.get_daily_order_totals = AsyncMock(return_value=rollup(200))
+    await worker.refresh_sales_stats()
+    coef, intercept = worker.sales_stats.coefficients()
+    reference = batch_refit(200)
+    assert worker.sales_stats.count == 200
+    assert coef == pytest.approx(reference.coef_)
+    assert intercept == pytest.approx(reference.intercept_)
+    expected = reference.predict([[date(2023, 3, 15).toordinal()]])
+    assert worker.predict_sales(["2023-03-15"]) == pytest.approx(expected)
+
+def test_forecast_dates_frequencies():
+    daily = forecast_dates(date(2024, 1, 1), date(2024, 1, 3), "D")
+    assert [str(d) for d in daily] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert len(forecast_dates(date(2024, 1, 1), date(2024, 1, 31), "W")) == 5
+    monthly = forecast_dates(date(2024, 1, 15), date(2024, 4, 1), "M")
+    assert [str(d) for d in monthly] == ["2024-02-01", "2024-03-01", "2024-04-01"]
+    with pytest.raises(ValueError):
+        forecast_dates(date(2024, 1, 2), date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        forecast_dates(date(2024, 1, 1), date(2024, 1, 2), "Y")
+
+def test_forecast_caches_series_until_model_changes(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    with pytest.raises(ModelNotTrainedError):
+        ai_insights.forecast([(date(2024, 1, 1), date(2024, 1, 2), "D")])
+
+    start = datetime(2023, 1, 1)
+    for i in range(10):
+        ai_insights.record_sales_order(start + timedelta(days=i), 100.0 + 10 * i)
+
+    ranges = [
+        (date(2023, 1, 11), date(2023, 1, 12), "D"),
+        (date(2023, 1, 11), date(2023, 1, 25), "W"),
     ]
+    result = ai_insights.forecast(ranges)
+    assert result["series"][0]["predictions"] == pytest.approx([200.0, 210.0])
+    assert result["series"][1]["dates"] == ["2023-01-11", "2023-01-18", "2023-01-25"]
+    assert result["series"][1]["predictions"] == pytest.approx([200.0, 270.0, 340.0])
+    predictions = ai_insights.predict_sales(["2023-01-11", "2023-01-12"])
+    assert predictions == pytest.approx([200.0, 210.0])
 
-    ai_insights.data_service.get_all_sales_orders = AsyncMock(return_value=test_orders)
+    # A repeated range is served from the cache without touching the model
+    stats = ai_insights.sales_stats
+    with patch.object(stats, "coefficients", side_effect=AssertionError):
+        assert ai_insights.forecast(ranges[:1])["series"][0] is result["series"][0]
 
-    segments = ai_insights.segment_customers()
-    assert isinstance(segments, DataFrame)
-    assert not segments.empty
+    ai_insights.record_sales_order(start + timedelta(days=10), 1200.0)
+    updated = ai_insights.forecast(ranges[:1])
+    assert updated["model_version"] != result["model_version"]
+    assert updated["series"][0]["predictions"] != pytest.approx([200.0, 210.0])
+
+def test_explanations_sum_to_predictions_without_a_trained_explainer(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    start = datetime(2023, 1, 1)
+    ai_insights.sales_stats.update_batch(
+        [[(start + timedelta(days=i)).toordinal()] for i in range(10)],
+        [100.0 + 10 * i for i in range(10)],
+    )
+
+    # Same values as a SHAP LinearExplainer over the training data, without the data
+    contributions = ai_insights.explain_predictions(["2023-01-01", "2023-01-10"])
+    assert contributions[:, 0] == pytest.approx([-45.0, 45.0])
+
+    result = ai_insights.explain([(date(2023, 1, 11), date(2023, 1, 12), "D")])
+    assert result["base_value"] == pytest.approx(145.0)
+    series = result["series"][0]
+    assert series["predictions"] == pytest.approx([200.0, 210.0])
+    assert series["contributions"]["date_ordinal"] == pytest.approx([55.0, 65.0])
+    again = ai_insights.explain([(date(2023, 1, 11), date(2023, 1, 12), "D")])
+    assert again["series"][0] is series
+
+def test_forecast_points_match_dates():
+    ranges = [
+        (date(2024, 1, 1), date(2024, 1, 1)),
+        (date(2024, 1, 15), date(2024, 4, 1)),
+        (date(2024, 1, 2), date(2024, 1, 31)),
+        (date(2023, 12, 31), date(2025, 3, 5)),
+    ]
+    for start, end in ranges:
+        for freq in ("D", "W", "M"):
+            expected = len(forecast_dates(start, end, freq))
+            assert forecast_points(start, end, freq) == expected
+
+def test_oversized_forecast_is_rejected_before_building_dates(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    ai_insights.sales_stats.update_batch([[738000.0], [738001.0]], [1.0, 2.0])
+    huge = (date(1, 1, 1), date(9999, 12, 31), "D")
+    with patch("services.ai_insights.forecast_dates", side_effect=AssertionError):
+        with pytest.raises(ValueError, match="exceeds the limit"):
+            ai_insights.forecast([huge])
+        with pytest.raises(ValueError, match="series per forecast"):
+            ai_insights.forecast([huge] * 50)
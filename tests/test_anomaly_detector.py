@@ -1,21 +1,66 @@
+import asyncio
+import threading
+import time
 import pytest
+import numpy as np
 from services.anomaly_detector import AnomalyDetector
+from services.anomaly_sink import AnomalySink
+from utils.running_stats import RunningStatistics
 from models.anomaly import Anomaly
 from utils.async_db import get_async_session
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 @pytest.mark.asyncio
 async def test_detect_anomaly():
     detector = AnomalyDetector()
 
     # Mock historical data
-    with patch.object(detector, 'get_historical_data', return_value=[100, 105, 110, 95, 90]):
+    history = AsyncMock(return_value=[100, 105, 110, 95, 90])
+    with patch.object(detector, 'get_historical_data', history):
         is_anomaly = await detector.detect_anomaly(150)
         assert is_anomaly is True
 
         is_anomaly = await detector.detect_anomaly(100)
         assert is_anomaly is False
 
+        # History is only read once; later values update the statistics in memory
+        detector.get_historical_data.assert_awaited_once()
+        assert detector.stats.count == 7
+
+def test_running_statistics_match_numpy():
+    values = np.random.default_rng(0).normal(100, 15, size=500)
+
+    stats = RunningStatistics()
+    stats.update_many(values)
+    assert stats.mean == pytest.approx(np.mean(values))
+    assert stats.std == pytest.approx(np.std(values))
+
+    windowed = RunningStatistics(window=50)
+    windowed.update_many(values)
+    assert windowed.count == 50
+    assert windowed.mean == pytest.approx(np.mean(values[-50:]))
+    assert windowed.std == pytest.approx(np.std(values[-50:]))
+
+def test_running_statistics_decay_matches_ewma():
+    alpha = 0.3
+    values = [10.0, 12.0, 9.0, 15.0, 11.0, 30.0]
+
+    decayed = RunningStatistics(decay=alpha)
+    decayed.update(values[0])
+    # The first sample seeds the mean with no spread
+    assert decayed.mean == values[0]
+    assert decayed.variance == 0.0
+
+    mean, variance = values[0], 0.0
+    for value in values[1:]:
+        decayed.update(value)
+        diff = value - mean
+        mean = mean + alpha * diff
+        variance = (1 - alpha) * (variance + alpha * diff * diff)
+        assert decayed.mean == pytest.approx(mean)
+        assert decayed.variance == pytest.approx(variance)
+    assert decayed.count == len(values)
+
 @pytest.mark.asyncio
 async def test_process_data():
     detector = AnomalyDetector()
@@ -37,6 +82,9 @@ async def test_store_anomaly():
     value = 150.0
 
     await detector.store_anomaly(value)
+    await detector.anomaly_sink.stop()
+    assert detector.anomaly_sink.flushed_rows == 1
+    assert detector.anomaly_sink.queue_depth == 0
 
     # Verify anomaly is stored
     async with get_async_session() as session:
@@ -51,3 +99,61 @@ async def test_store_anomaly():
             "DELETE FROM anomalies WHERE value = :value", {"value": value}
         )
         await session.commit()
+
+@pytest.mark.asyncio
+async def test_process_batch():
+    detector = AnomalyDetector()
+    history = np.array([100, 105, 110, 95, 90], dtype=float)
+    detector.get_historical_data = AsyncMock(return_value=history)
+    detector.store_anomaly = AsyncMock()
+    detector.notification_service.send_anomaly_alert = AsyncMock()
+
+    await detector.process_batch(np.array([100.0, 150.0, 98.0]))
+
+    detector.store_anomaly.assert_awaited_once_with(150.0)
+    detector.notification_service.send_anomaly_alert.assert_awaited_once_with(150.0)
+    assert detector.stats.count == 8
+
+@pytest.mark.asyncio
+async def test_anomaly_sink_retries_failed_flushes():
+    sink = AnomalySink(flush_retries=2, flush_backoff=0.001)
+    sink._insert = AsyncMock(side_effect=[ConnectionError("database restarting"), None])
+
+    await sink.add(150.0)
+    await sink.stop()
+    assert sink._insert.await_count == 2
+    assert sink.metrics()["flush_retry_count"] == 1
+    assert sink.flushed_rows == 1
+    assert sink.failed_rows == 0
+
+    # Rows are only dropped once every retry has failed
+    sink._insert = AsyncMock(side_effect=ConnectionError("database down"))
+    await sink.add(175.0)
+    await sink.stop()
+    assert sink._insert.await_count == 3
+    assert sink.failed_rows == 1
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_closes_consumer_after_poll_returns():
+    detector = AnomalyDetector()
+    detector.kafka_consumer.close()
+    detector.seed_statistics = AsyncMock()
+    events = []
+    polling = threading.Event()
+
+    def consume(batch_size, timeout):
+        polling.set()
+        time.sleep(0.1)
+        events.append("consume returned")
+        return []
+
+    detector.kafka_consumer = MagicMock()
+    detector.kafka_consumer.consume.side_effect = consume
+    detector.kafka_consumer.close.side_effect = lambda: events.append("closed")
+
+    task = asyncio.create_task(detector.consume_stream())
+    await asyncio.get_running_loop().run_in_executor(None, polling.wait)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert events == ["consume returned", "closed"]
@@ -1,4 +1,5 @@
 import pytest
+import json
 from httpx import AsyncClient
 from services.api_service import app
 from services.auth_service import AuthService
@@ -69,3 +70,44 @@ async def test_predict_sales_endpoint():
 
     # Clean up
     await user_service.delete_user(new_user.id)
+
+@pytest.mark.asyncio
+async def test_bulk_create_orders_ndjson_endpoint():
+    auth_service = AuthService()
+    user_service = UserService()
+
+    # Create test user
+    username = "testuser_api_bulk"
+    password = "testpassword"
+    role = "admin"
+    permissions = ["create_order"]
+    new_user = await user_service.create_user(username, password, role, permissions)
+
+    # Get token
+    token = auth_service.create_token(new_user.id, role, permissions)
+
+    lines = [
+        json.dumps({"customer_name": f"Bulk Customer {i}", "items": [
+            {"product_name": "Product A", "quantity": 1, "price": 10.0}
+        ]})
+        for i in range(3)
+    ]
+    lines.insert(1, '{"customer_name": "Missing items"}')
+    lines.insert(3, "not json")
+
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.post(
+            "/api/v1/orders/bulk",
+            content="\n".join(lines).encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/x-ndjson",
+            }
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["inserted"] == 3
+        assert [error["index"] for error in data["errors"]] == [1, 3]
+
+    # Clean up
+    await user_service.delete_user(new_user.id)
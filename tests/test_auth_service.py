@@ -1,10 +1,16 @@
 import pytest
 from services.auth_service import AuthService
+from services.security.security import PasswordHasher, PasswordQueueFull
 from services.user_service import UserService
 from utils.async_db import get_async_session
 from models.user import User
-from utils.permissions import VALID_PERMISSIONS
+from utils.permissions import VALID_PERMISSIONS, has_permission, permission_mask
 from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import asyncio
+import bcrypt
+import jwt
+import time
 
 @pytest.mark.asyncio
 async def test_create_token():
@@ -28,6 +34,33 @@ def test_verify_token():
     assert decoded["role"] == role
     assert decoded["permissions"] == permissions
 
+def test_verified_token_is_cached_until_exp():
+    auth_service = AuthService()
+    token = jwt.encode(
+        {
+            "user_id": 2,
+            "permissions": ["view_order"],
+            "exp": datetime.utcnow() + timedelta(seconds=1),
+            "iss": "NebuloViz",
+        },
+        auth_service.secret_key,
+        algorithm=auth_service.algorithm,
+    )
+
+    first = auth_service.verify_token(token)
+    assert auth_service.verify_token(token) is first
+    assert has_permission(first, permission_mask(["view_order"]))
+    assert not has_permission(first, permission_mask(["view_order", "delete_order"]))
+
+    time.sleep(1.1)
+    assert auth_service.verify_token(token) is None
+
+def test_permission_mask_rejects_unknown_permissions_when_strict():
+    assert permission_mask(["create_order", "view_order"]) == 0b11
+    assert permission_mask(["not_a_permission"]) == 0
+    with pytest.raises(ValueError):
+        permission_mask(["not_a_permission"], strict=True)
+
 @pytest.mark.asyncio
 async def test_authenticate_user():
     auth_service = AuthService()
@@ -57,3 +90,16 @@ async def test_authenticate_user():
     async with get_async_session() as session:
         await session.delete(new_user)
         await session.commit()
+
+@pytest.mark.asyncio
+async def test_password_hasher_refuses_logins_beyond_queue():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    hashed = bcrypt.hashpw(b"testpassword", bcrypt.gensalt(4)).decode('utf-8')
+
+    first = asyncio.ensure_future(hasher.verify("testpassword", hashed))
+    await asyncio.sleep(0)
+    with pytest.raises(PasswordQueueFull):
+        await hasher.verify("testpassword", hashed)
+
+    assert await first
+    assert not await hasher.verify("wrongpassword", hashed)
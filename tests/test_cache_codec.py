@@ -0,0 +1,42 @@
+import numpy as np
+from datetime import datetime
+import models.user  # noqa: F401
+from models.sales_order import SalesOrder, SalesOrderLine
+from services.cache_codec import build_codec
+
+
+def test_sales_order_round_trips_to_same_type():
+    codec = build_codec("msgpack")
+    order = SalesOrder(
+        id=7,
+        customer_name="Codec Customer",
+        created_at=datetime(2023, 12, 1, 9, 30),
+        user_id=1,
+        items=[
+            SalesOrderLine(
+                id=1, sales_order_id=7, product_name="Widget", quantity=2, price=9.5
+            )
+        ],
+    )
+
+    decoded = codec.loads(codec.dumps([order]))[0]
+    assert isinstance(decoded, SalesOrder)
+    assert decoded.id == 7
+    assert decoded.created_at == datetime(2023, 12, 1, 9, 30)
+    assert isinstance(decoded.items[0], SalesOrderLine)
+    assert decoded.items[0].price == 9.5
+
+
+def test_numpy_arrays_and_plain_values_round_trip():
+    codec = build_codec("msgpack")
+    value = {
+        "matrix": np.arange(12, dtype=np.float32).reshape(3, 4),
+        "rows": [{"total": 1.5, "created_at": datetime(2023, 1, 1)}],
+        "missing": None,
+    }
+
+    decoded = codec.loads(codec.dumps(value))
+    assert decoded["matrix"].dtype == np.float32
+    np.testing.assert_array_equal(decoded["matrix"], value["matrix"])
+    assert decoded["rows"] == value["rows"]
+    assert decoded["missing"] is None
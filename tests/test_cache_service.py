@@ -0,0 +1,185 @@
+import asyncio
+import time
+import fakeredis
+import pytest
+# The aioredis 1.x shim is picked explicitly;
+# fakeredis.aioredis follows the installed redis-py
+from fakeredis._aioredis1 import create_redis_pool
+from services.cache_service import CacheService, LocalCache
+from utils import redis_pool
+
+
+def test_local_cache_evicts_least_recently_used_and_expires():
+    local = LocalCache(max_entries=2, ttl=60)
+    local.set("a", b"1", 60)
+    local.set("b", b"2", 60)
+    assert local.get("a") == b"1"
+    local.set("c", b"3", 60)
+    assert local.get("b") is None
+    assert local.get("a") == b"1"
+
+    local.set("short", b"4", 0.01)
+    time.sleep(0.02)
+    assert local.get("short") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_every_worker_l1():
+    server = fakeredis.FakeServer()
+    workers = []
+    for _ in range(2):
+        redis = await create_redis_pool(server)
+        workers.append(CacheService(serializer="json", redis=redis, l1_enabled=True))
+    calls = []
+
+    def make_reader(worker):
+        @worker.cached(timeout=60)
+        async def get_totals(day):
+            calls.append(day)
+            return {"day": day, "total": len(calls)}
+        return get_totals
+
+    readers = [make_reader(worker) for worker in workers]
+
+    assert await readers[0]("mon") == {"day": "mon", "total": 1}
+    assert await readers[1]("mon") == {"day": "mon", "total": 1}
+    assert await readers[1]("mon") == {"day": "mon", "total": 1}
+    assert calls == ["mon"]
+    assert workers[1].metrics()["l2_hits"] == 1
+    assert workers[1].metrics()["l1_hits"] == 1
+
+    await asyncio.sleep(0.05)  # let both listeners subscribe
+    await workers[0].invalidate("get_totals")
+    await asyncio.sleep(0.05)
+
+    assert await readers[1]("mon") == {"day": "mon", "total": 2}
+    assert await readers[0]("mon") == {"day": "mon", "total": 2}
+
+    for worker in workers:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_bumps_generation_and_leaves_old_entries_to_expire():
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    service = CacheService(serializer="json", redis=redis, l1_enabled=False)
+    calls = []
+
+    class Orders:
+        @service.cached(timeout=60)
+        async def get_order(self, order_id, load="items"):
+            calls.append(order_id)
+            return {"id": order_id, "version": len(calls)}
+
+        @service.cached(timeout=60)
+        async def get_orders(self, limit=10):
+            return ["unrelated"]
+
+    for order_id in range(50):
+        await Orders().get_order(order_id)
+    await Orders().get_orders()
+    # Positional and keyword calls map to the same entry, on any instance
+    assert await Orders().get_order(order_id=0, load="items") == {"id": 0, "version": 1}
+    assert len(calls) == 50
+    entries = len(await redis.keys("*"))
+
+    await service.invalidate("get_order")
+
+    assert len(await redis.keys("*")) == entries + 1  # only the tag counter was added
+    assert await Orders().get_order(0) == {"id": 0, "version": 51}
+    await Orders().get_orders()
+    assert service.metrics()["l2_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_computation():
+    server = fakeredis.FakeServer()
+    workers = []
+    for _ in range(2):
+        redis = await create_redis_pool(server)
+        workers.append(CacheService(serializer="json", redis=redis, l1_enabled=False))
+    calls = []
+
+    def make_reader(worker):
+        @worker.cached(timeout=60, lock=True)
+        async def get_page(page):
+            calls.append(page)
+            await asyncio.sleep(0.1)
+            return {"page": page}
+        return get_page
+
+    readers = [make_reader(worker) for worker in workers]
+    results = await asyncio.gather(*(readers[i % 2](1) for i in range(40)))
+
+    assert results == [{"page": 1}] * 40
+    assert calls == [1]
+    assert workers[0].metrics()["coalesced"] + workers[1].metrics()["coalesced"] == 38
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_refreshed_in_background():
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    service = CacheService(serializer="json", redis=redis, l1_enabled=False)
+    calls = []
+
+    @service.cached(timeout=0, stale_ttl=60)
+    async def get_summary():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return {"version": len(calls)}
+
+    assert await get_summary() == {"version": 1}
+    # Already expired: served stale at once, with a single refresh behind it
+    assert await asyncio.gather(get_summary(), get_summary()) == [{"version": 1}] * 2
+    await asyncio.sleep(0.1)
+
+    assert len(calls) == 2
+    assert service.metrics()["stale_hits"] == 2
+    assert await get_summary() == {"version": 2}
+
+
+@pytest.mark.asyncio
+async def test_cache_opens_one_shared_pool_on_first_use(monkeypatch):
+    server = fakeredis.FakeServer()
+    opened = []
+
+    async def fake_pool(address, **kwargs):
+        opened.append(address)
+        return await create_redis_pool(server)
+
+    monkeypatch.setattr(redis_pool.aioredis, "create_redis_pool", fake_pool)
+    service = CacheService(serializer="json", l1_enabled=False)
+    assert opened == []
+
+    @service.cached(timeout=60)
+    async def get_count():
+        return 1
+
+    await asyncio.gather(get_count(), get_count(), service.invalidate("get_count"))
+    assert await redis_pool.get_redis() is await redis_pool.get_redis()
+    assert len(opened) == 1
+
+    await redis_pool.close_redis()
+
+
+@pytest.mark.asyncio
+async def test_hit_without_l1_is_one_round_trip():
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    service = CacheService(serializer="json", redis=redis, l1_enabled=False)
+
+    @service.cached(timeout=60, tags=["orders", "customers"])
+    async def get_report(day):
+        return {"day": day}
+
+    await get_report("mon")
+    commands = []
+    execute = redis.execute
+
+    async def record(command, *args, **kwargs):
+        commands.append(command)
+        return await execute(command, *args, **kwargs)
+
+    redis.execute = record
+    assert await get_report("mon") == {"day": "mon"}
+    assert commands == [b"EVAL"]
+    assert service.metrics()["l2_hits"] == 1
@@ -1,9 +1,17 @@
 import pytest
-from services.data_service import DataService
+from services.data_service import DataService, encode_cursor, decode_cursor
+from services.interfaces.data_interface import LoadStrategy
+from utils.async_db import async_engine
+from sqlalchemy import event
 from models.sales_order import SalesOrder
-from utils.async_db import get_async_session
 from sqlalchemy.exc import NoResultFound
 from asyncio import sleep
+from datetime import date, datetime
+from services.sales_rollup import (
+    MAX_QUERY_PARAMETERS, SalesRollupDelta, heatmap_matrix, trend_series, week_start,
+)
+from sqlalchemy.dialects import postgresql
+from unittest.mock import AsyncMock
 
 @pytest.mark.asyncio
 async def test_add_and_get_sales_order():
@@ -29,9 +37,7 @@ async def test_add_and_get_sales_order():
     assert fetched_order_cached.id == new_order.id
 
     # Clean up test data
-    async with get_async_session() as session:
-        await session.delete(new_order)
-        await session.commit()
+    await data_service.delete_sales_order(new_order.id)
 
 @pytest.mark.asyncio
 async def test_get_all_sales_orders():
@@ -50,10 +56,8 @@ async def test_get_all_sales_orders():
     assert len(orders) >= 5
 
     # Clean up test data
-    async with get_async_session() as session:
-        for order in orders_to_add:
-            await session.delete(order)
-        await session.commit()
+    for order in orders_to_add:
+        await data_service.delete_sales_order(order.id)
 
 @pytest.mark.asyncio
 async def test_delete_sales_order():
@@ -71,3 +75,161 @@ async def test_delete_sales_order():
     # Try fetching the deleted order
     fetched_order = await data_service.get_sales_order(new_order.id)
     assert fetched_order is None
+
+@pytest.mark.asyncio
+async def test_sales_trend_rollup():
+    data_service = DataService()
+    today = datetime.utcnow().date()
+    before = await data_service.get_sales_trend(today, today)
+
+    new_order = await data_service.add_sales_order(
+        "Trend Test Customer",
+        [{"product_name": "Product T", "quantity": 3, "price": 10.0}],
+        user_id=1
+    )
+    after = await data_service.get_sales_trend(today, today)
+    assert after["dates"] == [today.isoformat()]
+    assert after["sales"][0] == pytest.approx(before["sales"][0] + 30.0)
+    assert after["order_counts"][0] == before["order_counts"][0] + 1
+    assert after["line_counts"][0] == before["line_counts"][0] + 1
+
+    await data_service.delete_sales_order(new_order.id)
+    restored = await data_service.get_sales_trend(today, today)
+    assert restored["sales"][0] == pytest.approx(before["sales"][0])
+    assert restored["order_counts"][0] == before["order_counts"][0]
+
+def test_trend_series_zero_fills_missing_days():
+    trend = trend_series(date(2023, 12, 1), date(2023, 12, 4), [
+        (date(2023, 12, 3), 30.0, 1, 2),
+        (date(2023, 12, 1), 10.5, 2, 3),
+    ])
+    assert trend == {
+        "dates": ["2023-12-01", "2023-12-02", "2023-12-03", "2023-12-04"],
+        "sales": [10.5, 0.0, 30.0, 0.0],
+        "order_counts": [2, 0, 1, 0],
+        "line_counts": [3, 0, 2, 0],
+    }
+
+@pytest.mark.asyncio
+async def test_sales_trend_rejects_long_spans():
+    with pytest.raises(ValueError):
+        await DataService().get_sales_trend(date(1000, 1, 1), date(9000, 12, 30))
+
+def test_heatmap_matrix_combines_weekly_slices():
+    assert week_start(date(2023, 12, 3)) == date(2023, 11, 27)
+
+    matrix = heatmap_matrix([(0, 9, 10.0), (0, 9, 5.0), (6, 23, 1.5)])
+    assert matrix.shape == (7, 24)
+    assert matrix[0, 9] == 15.0
+    assert matrix[6, 23] == 1.5
+    assert matrix.sum() == 16.5
+
+@pytest.mark.asyncio
+async def test_rollup_delta_stays_under_the_parameter_limit():
+    delta = SalesRollupDelta()
+    # 6000 distinct heatmap cells would need 36000 parameters in one statement
+    for product in range(250):
+        for hour in range(24):
+            delta.add_order(datetime(2023, 12, 4, hour), [(f"Product {product}", 1.0)])
+    assert len(delta.cells) == 6000
+
+    session = AsyncMock()
+    await delta.apply(session)
+    statements = [call.args[0] for call in session.execute.await_args_list]
+    dialect = postgresql.dialect()
+    params = [len(stmt.compile(dialect=dialect).params) for stmt in statements]
+    assert len(statements) == 3
+    assert max(params) <= MAX_QUERY_PARAMETERS
+    assert sum(params) == 4 + 6000 * 6
+
+def test_cursor_round_trip():
+    created_at = datetime(2023, 12, 1, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_list_sales_orders_keyset_pagination():
+    data_service = DataService()
+    orders_to_add = []
+    for i in range(5):
+        order = await data_service.add_sales_order(
+            f"Keyset Customer {i}",
+            [{"product_name": f"Product {i}", "quantity": 1, "price": 10.0}],
+            user_id=1
+        )
+        orders_to_add.append(order)
+
+    first_page = await data_service.list_sales_orders(limit=3)
+    assert len(first_page["orders"]) == 3
+    assert first_page["next_cursor"] is not None
+
+    second_page = await data_service.list_sales_orders(
+        limit=3, cursor=first_page["next_cursor"]
+    )
+    first_ids = {order["id"] for order in first_page["orders"]}
+    assert not first_ids & {order["id"] for order in second_page["orders"]}
+
+    # Clean up test data
+    for order in orders_to_add:
+        await data_service.delete_sales_order(order.id)
+
+@pytest.mark.asyncio
+async def test_listing_query_count_is_constant():
+    data_service = DataService()
+    orders_to_add = []
+    for i in range(6):
+        order = await data_service.add_sales_order(
+            f"Query Count Customer {i}",
+            [{"product_name": f"Product {i}", "quantity": 1, "price": 5.0}] * 2,
+            user_id=1
+        )
+        orders_to_add.append(order)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Bypass the cache decorator so every call reaches the database
+    uncached_listing = DataService.get_all_sales_orders.__wrapped__.__wrapped__
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        for load in LoadStrategy:
+            counts = []
+            for page_size in (2, 6):
+                statements.clear()
+                await uncached_listing(data_service, page_size, 0, load=load)
+                counts.append(len(statements))
+            assert counts[0] == counts[1]
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    for order in orders_to_add:
+        await data_service.delete_sales_order(order.id)
+
+@pytest.mark.asyncio
+async def test_add_sales_orders_bulk_reports_row_errors():
+    data_service = DataService()
+    orders = [
+        {
+            "customer_name": "Bulk A",
+            "items": [{"product_name": "P", "quantity": 1, "price": 1.0}],
+        },
+        {"customer_name": None, "items": []},  # violates NOT NULL
+        {
+            "customer_name": "Bulk C",
+            "items": [{"product_name": "P", "quantity": 2, "price": 3.0}],
+        },
+    ]
+
+    result = await data_service.add_sales_orders_bulk(orders, user_id=1)
+    assert [row["index"] for row in result["orders"]] == [0, 2]
+    assert [error["index"] for error in result["errors"]] == [1]
+    assert result["orders"][1]["total"] == 6.0
+
+    # Clean up test data
+    for row in result["orders"]:
+        await data_service.delete_sales_order(row["order_id"])
@@ -0,0 +1,47 @@
+import io
+import json
+from utils.logger import JsonLogger
+
+
+def read_records(stream: io.StringIO):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_point_at_the_caller():
+    stream = io.StringIO()
+    logger = JsonLogger("test_logger_caller", queued=False, stream=stream)
+    logger.info("Order placed", order_id=1)
+
+    record, = read_records(stream)
+    assert record["message"] == "Order placed"
+    assert record["module"] == "test_logger"
+    assert record["function"] == "test_records_point_at_the_caller"
+    assert record["extra"] == {"order_id": 1}
+
+
+def test_sampled_records_report_suppressed_count():
+    stream = io.StringIO()
+    logger = JsonLogger(
+        "test_logger_sampled", queued=False, sample_interval=60, stream=stream
+    )
+    for user_id in range(5):
+        logger.info("Token verified", sampled=True, user_id=user_id)
+    logger.warning("Token expired")
+    messages = [r["message"] for r in read_records(stream)]
+    assert messages == ["Token verified", "Token expired"]
+
+    # Once the window has passed the next record carries the count of dropped ones
+    logger._samples["Token verified"][0] -= 60
+    logger.info("Token verified", sampled=True, user_id=9)
+    assert read_records(stream)[-1]["extra"] == {"user_id": 9, "suppressed": 4}
+
+
+def test_queued_records_are_written_by_the_listener():
+    stream = io.StringIO()
+    logger = JsonLogger("test_logger_queued", queued=True, stream=stream)
+    logger.info("Queued", value=1.5)
+    logger.close()
+
+    record, = read_records(stream)
+    assert record["extra"] == {"value": 1.5}
+    assert record["function"] == "test_queued_records_are_written_by_the_listener"
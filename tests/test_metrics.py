@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import fakeredis
+import pytest
+from fakeredis._aioredis1 import create_redis_pool
+from prometheus_client import REGISTRY
+from services.cache_service import CacheService
+from utils.metrics import render_metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.asyncio
+async def test_cache_events_are_exported():
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    cache = CacheService(serializer="json", redis=redis, l1_enabled=False)
+
+    @cache.cached(timeout=60)
+    async def get_metric_totals(day):
+        return {"day": day}
+
+    def sample(event):
+        value = REGISTRY.get_sample_value(
+            "nebuloviz_cache_events_total", {"event": event}
+        )
+        return value or 0.0
+
+    misses, hits = sample("l2_misses"), sample("l2_hits")
+    await get_metric_totals("2024-01-01")
+    await get_metric_totals("2024-01-01")
+    assert sample("l2_misses") == misses + 1
+    assert sample("l2_hits") == hits + 1
+    assert REGISTRY.get_sample_value(
+        "nebuloviz_cache_operation_duration_seconds_count", {"operation": "load"}
+    ) >= 1
+
+    body, content_type = render_metrics()
+    assert b"nebuloviz_cache_events_total" in body
+    assert content_type.startswith("text/plain")
+
+
+def test_multiprocess_mode_aggregates_workers(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=ROOT)
+    record = "from utils.metrics import ANOMALY_MESSAGES; ANOMALY_MESSAGES.inc(3)"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], env=env, check=True, cwd=ROOT)
+    scrape = (
+        "import sys; from utils.metrics import render_metrics; "
+        "sys.stdout.buffer.write(render_metrics()[0])"
+    )
+    body = subprocess.run(
+        [sys.executable, "-c", scrape],
+        env=env,
+        check=True,
+        cwd=ROOT,
+        capture_output=True,
+    ).stdout.decode()
+    assert "nebuloviz_anomaly_messages_total 6.0" in body
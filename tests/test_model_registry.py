@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+from services.ai_insights import AIInsights, CUSTOMER_SEGMENTATION, SALES_FORECAST
+from services.model_registry import ModelRegistry
+from utils.running_stats import RunningLinearRegression
+
+
+def fitted_stats(slope: float) -> RunningLinearRegression:
+    stats = RunningLinearRegression()
+    days = np.arange(738000, 738030, dtype=float)
+    stats.update_batch(days, slope * days)
+    return stats
+
+
+def test_publish_loads_memory_mapped_and_prunes_old_versions(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path), keep_versions=2)
+
+    versions = [
+        registry.publish(SALES_FORECAST, fitted_stats(slope), {"slope": slope})
+        for slope in (1, 2, 3)
+    ]
+
+    assert versions == ["000001", "000002", "000003"]
+    assert registry.current_version(SALES_FORECAST) == "000003"
+    assert registry.versions(SALES_FORECAST) == ["000002", "000003"]
+    entries = os.listdir(tmp_path / SALES_FORECAST)
+    assert not [entry for entry in entries if entry.startswith(".")]
+
+    stats, metadata = registry.load(SALES_FORECAST)
+    assert metadata["slope"] == 3
+    assert isinstance(stats.c_xx, np.memmap)
+    assert stats.coefficients()[0] == pytest.approx([3.0])
+
+
+def test_late_publisher_never_moves_current_back(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path))
+    for slope in (1, 2):
+        registry.publish(SALES_FORECAST, fitted_stats(slope))
+
+    # The publisher of version 1 reaches CURRENT after version 2's
+    registry._set_current(SALES_FORECAST, "000001")
+    assert registry.current_version(SALES_FORECAST) == "000002"
+
+    assert registry.publish(SALES_FORECAST, fitted_stats(3)) == "000003"
+    assert registry.current_version(SALES_FORECAST) == "000003"
+
+
+@pytest.mark.asyncio
+async def test_workers_pick_up_new_versions(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path))
+    registry.publish(SALES_FORECAST, fitted_stats(1))
+    worker = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    assert worker.predict_sales(["2023-01-01"]) == pytest.approx([738521.0])
+
+    registry.publish(SALES_FORECAST, fitted_stats(2))
+    customers = [[10.0, 1], [20.0, 2], [300.0, 9]]
+    scaler = StandardScaler().fit(customers)
+    kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
+    kmeans.fit(scaler.transform(customers))
+    registry.publish(CUSTOMER_SEGMENTATION, {"kmeans": kmeans, "scaler": scaler})
+    await worker.reload_models()
+
+    assert worker.model_versions == {
+        SALES_FORECAST: "000002", CUSTOMER_SEGMENTATION: "000001"
+    }
+    assert worker.predict_sales(["2023-01-01"]) == pytest.approx([2 * 738521.0])
+    # Copy-on-write mapping still accepts in-place online updates
+    worker.record_sales_order(__import__("datetime").datetime(2023, 1, 2), 2 * 738522.0)
+    segment = worker.kmeans_model.predict(worker.scaler.transform([[15.0, 1]]))
+    assert segment.shape == (1,)
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from aiosmtpd.controller import Controller
+from services.notification_service import NotificationService
+
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps every delivered message."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.content.decode('utf-8'))
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025)
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+def local_notification_service(window: float) -> NotificationService:
+    service = NotificationService()
+    service.smtp_server = "127.0.0.1"
+    service.smtp_port = 8025
+    service.use_tls = False
+    service.password = ""
+    service.digest_window = window
+    return service
+
+
+@pytest.mark.asyncio
+async def test_alert_burst_is_coalesced_into_one_digest(smtp_server):
+    service = local_notification_service(window=0.2)
+
+    for value in (150.0, 160.0, 170.0):
+        await service.send_anomaly_alert(value)
+    await asyncio.sleep(0.5)
+
+    assert len(smtp_server.messages) == 1
+    assert "3 Anomalies Detected" in smtp_server.messages[0]
+    assert "170.0" in smtp_server.messages[0]
+
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_is_reused_and_pending_alerts_flush_on_close(smtp_server):
+    service = local_notification_service(window=60)
+
+    await service.send_email("First", "first body")
+    connection = service._smtp
+    await service.send_email("Second", "second body")
+    assert service._smtp is connection
+
+    await service.send_anomaly_alert(200.0)
+    await service.close()
+
+    assert len(smtp_server.messages) == 3
+    assert "Detected value: 200.0" in smtp_server.messages[-1]
+
+
+@pytest.mark.asyncio
+async def test_failed_send_closes_the_connection(smtp_server):
+    service = local_notification_service(window=60)
+
+    await service.send_email("First", "first body")
+    connection = service._smtp
+    with patch.object(
+        connection, "send_message", side_effect=RuntimeError("mailbox full")
+    ):
+        await service.send_email("Second", "second body")
+    assert service._smtp is None
+    assert not connection.is_connected
+
+    # The next email opens a fresh connection
+    await service.send_email("Third", "third body")
+    assert len(smtp_server.messages) == 2
+    await service.close()
@@ -0,0 +1,74 @@
+import os
+import time
+from unittest.mock import patch
+from config.settings import settings
+from utils.profiling import (
+    StackSampler, current_timings, has_profiling_token, phase, reset_timings,
+    server_timing, should_profile, start_timings, store_profile,
+)
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_phases_accumulate_only_inside_a_request():
+    with phase("db"):
+        pass
+    assert current_timings() == {}
+
+    token = start_timings()
+    timings = current_timings()
+    with phase("db"):
+        busy_wait(0.01)
+    with phase("db"):
+        busy_wait(0.01)
+    reset_timings(token)
+    assert timings["db"] >= 0.02
+
+    header = server_timing({"auth": 0.001, "db": 0.02}, 0.05)
+    assert header == (
+        "auth;dur=1.00, cache;dur=0.00, db;dur=20.00, "
+        "compute;dur=29.00, total;dur=50.00"
+    )
+
+
+def test_sampler_records_collapsed_stacks_and_runs_once():
+    sampler = StackSampler(interval=0.001)
+    assert sampler.start()
+    assert not StackSampler().start()
+    busy_wait(0.1)
+    stacks = sampler.stop()
+    assert any(stack.split(";")[-1].startswith("busy_wait") for stack in stacks)
+
+    # The next request can be profiled once the previous sampler stopped
+    assert StackSampler().start()
+    StackSampler._active_lock.release()
+
+
+def test_store_profile_keeps_newest_files(tmp_path):
+    ids = [
+        store_profile(
+            {"main;handler": i + 1}, "GET-/api/v1/orders/", str(tmp_path), keep=2
+        )
+        for i in range(3)
+    ]
+    expected = [ids[1] + ".collapsed", ids[2] + ".collapsed"]
+    assert sorted(os.listdir(tmp_path)) == expected
+    assert (tmp_path / (ids[2] + ".collapsed")).read_text() == "main;handler 3\n"
+
+
+def test_only_the_profiling_token_unlocks_timings():
+    with patch.object(settings, "PROFILING_TOKEN", None):
+        assert not has_profiling_token("anything")
+    with patch.object(settings, "PROFILING_TOKEN", "secret"), \
+            patch.object(settings, "PROFILING_SAMPLE_RATE", 0.0):
+        assert has_profiling_token("secret")
+        assert not has_profiling_token("guess")
+        assert not has_profiling_token(None)
+        # Starlette decodes header bytes as latin-1, so any client can send these
+        assert not has_profiling_token("s\xe9cret")
+        assert not should_profile("\u00ff" * 6)
+        assert should_profile("secret") and not should_profile("guess")
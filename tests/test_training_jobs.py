@@ -0,0 +1,86 @@
+import asyncio
+import fakeredis
+import pytest
+from unittest.mock import AsyncMock
+from fakeredis._aioredis1 import create_redis_pool
+from services.ai_insights import AIInsights, CUSTOMER_SEGMENTATION, SALES_FORECAST
+from services.model_registry import ModelRegistry
+from services.training_jobs import TrainingJobs
+
+
+@pytest.mark.asyncio
+async def test_training_job_reports_progress_and_is_deduplicated(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    release = asyncio.Event()
+
+    async def train():
+        await release.wait()
+        return "000001"
+
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    jobs = TrainingJobs(ai_insights, redis=redis)
+    jobs.trainers[CUSTOMER_SEGMENTATION] = train
+
+    job = await jobs.submit(CUSTOMER_SEGMENTATION)
+    assert job["status"] == "pending"
+    await asyncio.sleep(0)
+    assert (await jobs.get(job["id"]))["status"] == "running"
+    assert (await jobs.submit(CUSTOMER_SEGMENTATION))["id"] == job["id"]
+
+    release.set()
+    await asyncio.sleep(0.01)
+    finished = await jobs.get(job["id"])
+    assert finished["status"] == "succeeded"
+    assert finished["version"] == "000001"
+    assert (await jobs.submit(CUSTOMER_SEGMENTATION))["id"] != job["id"]
+    await jobs.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_training_job_records_the_error(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    jobs = TrainingJobs(ai_insights, redis=redis)
+    jobs.trainers[SALES_FORECAST] = AsyncMock(
+        side_effect=RuntimeError("database unavailable")
+    )
+
+    job = await jobs.submit(SALES_FORECAST)
+    await asyncio.sleep(0.01)
+
+    failed = await jobs.get(job["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "database unavailable"
+    with pytest.raises(ValueError):
+        await jobs.submit("unknown_model")
+
+
+@pytest.mark.asyncio
+async def test_active_job_key_is_only_released_or_replaced_by_its_holder(tmp_path):
+    ai_insights = AIInsights(registry=ModelRegistry(root=str(tmp_path)))
+    redis = await create_redis_pool(fakeredis.FakeServer())
+    jobs = TrainingJobs(ai_insights, redis=redis)
+    release = asyncio.Event()
+
+    async def train():
+        await release.wait()
+        return "000001"
+
+    jobs.trainers[SALES_FORECAST] = train
+    active_key = f"{jobs.prefix}:active:{SALES_FORECAST}"
+
+    # Two callers racing to replace a job whose record has expired start one job
+    await redis.set(active_key, "expired-job")
+    first, second = await asyncio.gather(
+        jobs.submit(SALES_FORECAST), jobs.submit(SALES_FORECAST)
+    )
+    assert first["id"] == second["id"]
+    assert await redis.get(active_key) == first["id"].encode()
+
+    # A job that outlived its timeout must not release its successor's key
+    await redis.set(active_key, "newer-job")
+    release.set()
+    await asyncio.sleep(0.01)
+    assert (await jobs.get(first["id"]))["status"] == "succeeded"
+    assert await redis.get(active_key) == b"newer-job"
+    await jobs.close()
@@ -1,8 +1,13 @@
 # utils/async_db.py
 
+import time
+from contextlib import asynccontextmanager
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from config.settings import settings
+from utils.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT, DB_POOL_SIZE
+from utils.profiling import phase
 
 # Replace 'postgresql://' with 'postgresql+asyncpg://' for async support
 async_engine = create_async_engine(
@@ -13,7 +18,32 @@ async_engine = create_async_engine(
 AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
 
 
+# Pool events fire before the pool updates its own counters, so the gauges
+# track the events instead
+_pool_events = {
+    "checkout": DB_POOL_CHECKED_OUT.inc,
+    "checkin": DB_POOL_CHECKED_OUT.dec,
+    "connect": DB_POOL_SIZE.inc,
+    "close": DB_POOL_SIZE.dec,
+    "close_detached": DB_POOL_SIZE.dec,
+}
+for _name, _update in _pool_events.items():
+    event.listen(
+        async_engine.sync_engine, _name, lambda *args, _update=_update: _update()
+    )
+
+
+@asynccontextmanager
 async def get_async_session():
-    """Provides a new asynchronous database session."""
-    async with AsyncSessionLocal() as session:
-        yield session
+    """Provides a new asynchronous database session.
+
+    The connection is checked out up front so the time spent waiting for
+    the pool is measured on its own. The session's lifetime counts as the
+    request's ``db`` phase.
+    """
+    with phase("db"):
+        async with AsyncSessionLocal() as session:
+            start = time.perf_counter()
+            await session.connection()
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+            yield session
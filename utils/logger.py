@@ -1,27 +1,75 @@
+import atexit
 import logging
-import json
-from datetime import datetime
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+import orjson
 from config.settings import settings
 
 
+class _RecordQueueHandler(QueueHandler):
+    """Enqueues records as they are.
+
+    ``JsonLogger`` never passes format arguments or exception info, so the
+    copy and pre-formatting ``QueueHandler.prepare`` does for arbitrary
+    records would only add work on the caller's thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
 class JsonLogger:
-    """Custom JSON logger for structured logging."""
+    """Custom JSON logger for structured logging.
 
-    def __init__(self, name: str):
+    With ``LOG_QUEUE_ENABLED`` the caller only enqueues the record; a
+    background thread formats and writes it. Records logged with
+    ``sampled=True`` are emitted at most once per ``LOG_SAMPLE_INTERVAL``
+    seconds per message, and the next emitted one reports how many were
+    suppressed in between.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        queued: Optional[bool] = None,
+        sample_interval: Optional[float] = None,
+        stream=None,
+    ):
         self.logger = logging.getLogger(name)
         log_level = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
         self.logger.setLevel(log_level)
-        handler = logging.StreamHandler()
+        if queued is None:
+            queued = settings.LOG_QUEUE_ENABLED
+        if sample_interval is None:
+            sample_interval = settings.LOG_SAMPLE_INTERVAL
+        self.sample_interval = sample_interval
+        # message -> [window start, records suppressed in the window]
+        self._samples: Dict[str, List] = {}
+        self.listener: Optional[QueueListener] = None
+        handler = logging.StreamHandler(stream)
         handler.setLevel(log_level)
         handler.setFormatter(self.JsonFormatter())
+        if queued:
+            log_queue = queue.SimpleQueue()
+            self.listener = QueueListener(
+                log_queue, handler, respect_handler_level=True
+            )
+            self.listener.start()
+            # Flush what is still queued when the process exits
+            atexit.register(self.close)
+            handler = _RecordQueueHandler(log_queue)
         self.logger.addHandler(handler)
 
     class JsonFormatter(logging.Formatter):
         """Formats log records as JSON."""
 
         def format(self, record):
+            created = datetime.fromtimestamp(record.created, timezone.utc)
             log_record = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": created.replace(tzinfo=None).isoformat(),
                 "level": record.levelname,
                 "message": record.getMessage(),
                 "module": record.module,
@@ -29,22 +77,52 @@ class JsonLogger:
                 "line": record.lineno,
                 "extra": getattr(record, 'extra', {})
             }
-            return json.dumps(log_record)
+            return orjson.dumps(
+                log_record,
+                default=str,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            ).decode('utf-8')
+
+    def _admit(self, message: str, context: Dict) -> bool:
+        """Applies per-message sampling, adding the suppressed count to ``context``."""
+        now = time.monotonic()
+        window = self._samples.get(message)
+        if window is not None and now - window[0] < self.sample_interval:
+            window[1] += 1
+            return False
+        if window is not None and window[1]:
+            context["suppressed"] = window[1]
+        self._samples[message] = [now, 0]
+        return True
 
-    def debug(self, message: str, **context):
-        self.logger.debug(message, extra={'extra': context})
+    def _log(self, level: int, message: str, context: Dict, sampled: bool = False):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sampled and self.sample_interval > 0 and not self._admit(message, context):
+            return
+        # stacklevel points module/function/line at the caller rather than this wrapper
+        self.logger.log(level, message, extra={'extra': context}, stacklevel=3)
 
-    def info(self, message: str, **context):
-        self.logger.info(message, extra={'extra': context})
+    def debug(self, message: str, sampled: bool = False, **context):
+        self._log(logging.DEBUG, message, context, sampled)
+
+    def info(self, message: str, sampled: bool = False, **context):
+        self._log(logging.INFO, message, context, sampled)
 
     def warning(self, message: str, **context):
-        self.logger.warning(message, extra={'extra': context})
+        self._log(logging.WARNING, message, context)
 
     def error(self, message: str, **context):
-        self.logger.error(message, extra={'extra': context})
+        self._log(logging.ERROR, message, context)
 
     def critical(self, message: str, **context):
-        self.logger.critical(message, extra={'extra': context})
+        self._log(logging.CRITICAL, message, context)
+
+    def close(self):
+        """Writes out queued records and stops the background thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
 
 
 # Initialize a global logger instance
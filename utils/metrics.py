@@ -0,0 +1,105 @@
+"""Prometheus metrics shared by the API, cache, database and stream processing.
+
+Uvicorn workers are separate processes, so when ``PROMETHEUS_MULTIPROC_DIR``
+is set every process writes its samples to files in that directory and
+``/metrics`` aggregates them. The directory must be emptied before the
+workers start, and gauges declare how samples from several processes are
+combined.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "nebuloviz_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+
+CACHE_EVENTS = Counter(
+    "nebuloviz_cache_events_total",
+    "Cache lookups and coalescing events (l1_hits, l2_misses, stale_hits, ...).",
+    ["event"],
+)
+CACHE_LATENCY = Histogram(
+    "nebuloviz_cache_operation_duration_seconds",
+    "Latency of Redis lookups and of computing missing entries.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "nebuloviz_db_pool_checkout_wait_seconds",
+    "Time a session waits for a pooled database connection.",
+    buckets=(
+        0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+    ),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "nebuloviz_db_pool_checked_out_connections",
+    "Database connections currently checked out.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "nebuloviz_db_pool_connections",
+    "Database connections held by the pool, idle or checked out.",
+    multiprocess_mode="livesum",
+)
+
+ANOMALY_MESSAGES = Counter(
+    "nebuloviz_anomaly_messages_total",
+    "Sales values scored by the anomaly detector.",
+)
+ANOMALIES_DETECTED = Counter(
+    "nebuloviz_anomalies_detected_total",
+    "Sales values flagged as anomalies.",
+)
+ANOMALY_BATCH_SIZE = Histogram(
+    "nebuloviz_anomaly_batch_size",
+    "Values per micro-batch consumed from Kafka.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+ANOMALY_CONSUMER_LAG = Gauge(
+    "nebuloviz_anomaly_consumer_lag_messages",
+    "Messages between the last consumed offset and the partition's high watermark.",
+    ["partition"],
+    multiprocess_mode="max",
+)
+
+AI_INFERENCE_DURATION = Histogram(
+    "nebuloviz_ai_inference_duration_seconds",
+    "Model inference latency.",
+    ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+AI_TRAINING_DURATION = Histogram(
+    "nebuloviz_ai_training_duration_seconds",
+    "Model training latency, from loading data to publishing the version.",
+    ["model"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+
+
+def render_metrics():
+    """Returns (body, content type) for a scrape, across all multiprocess workers."""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops this process's live gauges from the multiprocess directory."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
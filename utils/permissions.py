@@ -1,8 +1,37 @@
+from typing import Iterable, Mapping
+
+# Each permission's position is its bit in compiled permission masks, so only append
 VALID_PERMISSIONS = [
     "create_order",
     "view_order",
     "delete_order",
     "view_predictions",
     "view_segments",
+    "train_models",
     # Add more as needed
 ]
+
+PERMISSION_BITS = {
+    permission: 1 << bit for bit, permission in enumerate(VALID_PERMISSIONS)
+}
+
+
+def permission_mask(permissions: Iterable[str], strict: bool = False) -> int:
+    """Compiles permission names into a bitmask.
+
+    Unknown names grant nothing, or raise ValueError when ``strict``.
+    """
+    mask = 0
+    for permission in permissions:
+        bit = PERMISSION_BITS.get(permission)
+        if bit is None:
+            if strict:
+                raise ValueError(f"Unknown permission: {permission}")
+            continue
+        mask |= bit
+    return mask
+
+
+def has_permission(user: Mapping, required_mask: int) -> bool:
+    """Checks a verified token's compiled permissions against a required mask."""
+    return user.get("permission_mask", 0) & required_mask == required_mask
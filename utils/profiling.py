@@ -0,0 +1,182 @@
+"""Per-request phase timings and opt-in sampling profiles.
+
+``phase`` adds the time spent in a block to the current request's timings,
+which the API reports in a ``Server-Timing`` header. Phases must not nest.
+The header shows how long authentication took, which tells an anonymous
+caller whether a username exists, so by default it is only sent to
+requests carrying the profiling token.
+
+``StackSampler`` records the event-loop thread's stack every few
+milliseconds from a background thread and stores the counts in the
+collapsed-stack format that speedscope and flamegraph.pl read. Because it
+samples the whole loop, a profile also shows any requests that ran
+concurrently with the profiled one.
+"""
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from hmac import compare_digest
+from typing import Dict, Optional
+from config.settings import settings
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_SUFFIX = ".collapsed"
+
+# Phases reported in Server-Timing; the rest of the total is reported as compute
+PHASES = ("auth", "cache", "db")
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_timings():
+    """Starts collecting phase timings for the current request.
+
+    Returns a token for ``reset_timings``.
+    """
+    return _timings.set({})
+
+
+def current_timings() -> Dict[str, float]:
+    timings = _timings.get()
+    return timings if timings is not None else {}
+
+
+def reset_timings(token):
+    _timings.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    """Adds the time spent in the block to the current request's ``name`` phase."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """Formats phase timings and the remaining compute time as a Server-Timing value."""
+    entries = [(name, timings.get(name, 0.0)) for name in PHASES]
+    # Concurrent phases within one request can overlap, so the remainder is clamped
+    compute = max(total - sum(duration for _, duration in entries), 0.0)
+    entries.append(("compute", compute))
+    entries.append(("total", total))
+    return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, duration in entries)
+
+
+def has_profiling_token(header_value: Optional[str]) -> bool:
+    """Checks an ``X-Profile`` header value against the configured token."""
+    token = settings.PROFILING_TOKEN
+    if not header_value or not token:
+        return False
+    # compare_digest only accepts ASCII strings; headers may carry any byte
+    return compare_digest(header_value.encode(), token.encode())
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """Profiles requests carrying the configured token plus a sample of the rest."""
+    if has_profiling_token(header_value):
+        return True
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's call stack at a fixed interval from a background thread.
+
+    Only one sampler runs per process; ``start`` returns False while
+    another one is active.
+    """
+
+    _active_lock = threading.Lock()
+
+    def __init__(self, interval: Optional[float] = None):
+        if interval is None:
+            interval = settings.PROFILING_INTERVAL_MS / 1000
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Starts sampling the calling thread."""
+        if not self._active_lock.acquire(blocking=False):
+            return False
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self) -> Counter:
+        """Stops sampling and returns the sample count per collapsed stack."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._active_lock.release()
+        return self.stacks
+
+
+def store_profile(
+    stacks: Dict[str, int],
+    name: str,
+    directory: Optional[str] = None,
+    keep: Optional[int] = None,
+) -> str:
+    """Writes a collapsed-stack profile and deletes the oldest beyond ``keep``.
+
+    The file I/O blocks, so run it off the event loop.
+    """
+    directory = directory or settings.PROFILING_DIR
+    keep = keep or settings.PROFILING_MAX_FILES
+    os.makedirs(directory, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name).strip("_")
+    # Names sort by creation time, so retention can drop the first ones
+    created = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    profile_id = f"{created}-{uuid.uuid4().hex[:8]}-{safe_name}"
+    path = os.path.join(directory, profile_id + PROFILE_SUFFIX)
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {count}\n")
+    profiles = sorted(
+        entry for entry in os.listdir(directory) if entry.endswith(PROFILE_SUFFIX)
+    )
+    for entry in profiles[:-keep]:
+        try:
+            os.remove(os.path.join(directory, entry))
+        except FileNotFoundError:
+            pass
+    return profile_id
@@ -0,0 +1,44 @@
+# utils/redis_pool.py
+
+import asyncio
+from typing import Optional
+import aioredis
+from config.settings import settings
+
+_pool: Optional[aioredis.Redis] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_redis() -> aioredis.Redis:
+    """Returns the process-wide Redis pool, creating it on first use.
+
+    The cache and the rate limiter share this pool. A pool is bound to the
+    event loop that created it, so a new one is opened if the loop changes.
+    """
+    global _pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _pool is not None and not _pool.closed and _pool_loop is loop:
+        return _pool
+    if _pool_lock is None or _pool_loop is not loop:
+        _pool_lock = asyncio.Lock()
+        _pool_loop = loop
+        _pool = None
+    async with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = await aioredis.create_redis_pool(
+                settings.REDIS_URL,
+                minsize=settings.REDIS_POOL_MIN_SIZE,
+                maxsize=settings.REDIS_POOL_MAX_SIZE,
+                timeout=settings.REDIS_CONNECT_TIMEOUT,
+            )
+    return _pool
+
+
+async def close_redis():
+    """Closes the shared Redis pool if it was opened."""
+    global _pool
+    if _pool is not None and not _pool.closed:
+        _pool.close()
+        await _pool.wait_closed()
+    _pool = None
@@ -0,0 +1,216 @@
+import math
+from collections import deque
+from typing import Iterable, Optional
+import numpy as np
+
+
+class RunningStatistics:
+    """Incremental mean/variance tracker with O(1) updates.
+
+    Uses Welford's algorithm over the full history by default. Passing
+    ``decay`` switches to exponentially weighted statistics, and passing
+    ``window`` keeps exact statistics over the last ``window`` values only.
+    """
+
+    def __init__(self, decay: Optional[float] = None, window: Optional[int] = None):
+        if decay is not None and window is not None:
+            raise ValueError("decay and window are mutually exclusive")
+        if decay is not None and not 0.0 < decay <= 1.0:
+            raise ValueError("decay must be in (0, 1]")
+        if window is not None and window < 1:
+            raise ValueError("window must be a positive integer")
+        self.decay = decay
+        self.window = window
+        self._values = deque() if window is not None else None
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value: float):
+        """Adds a single value to the running statistics."""
+        value = float(value)
+        if self.decay is not None:
+            self._update_decayed(value)
+        elif self.window is not None:
+            self._update_windowed(value)
+        else:
+            self._update_cumulative(value)
+
+    def update_many(self, values: Iterable[float]):
+        """Adds a sequence of values in order."""
+        for value in values:
+            self.update(value)
+
+    def update_batch(self, values: np.ndarray):
+        """Adds a batch of values, merging cumulative statistics in one pass."""
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        if self.decay is not None or self.window is not None:
+            self.update_many(values.tolist())
+            return
+        # Chan et al. parallel combination of (count, mean, M2)
+        batch_count = values.size
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self._m2 += batch_m2 + delta * delta * self.count * batch_count / total
+        self.count = total
+
+    def _update_cumulative(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def _update_decayed(self, value: float):
+        if self.count == 0:
+            self.count = 1
+            self.mean = value
+            self._m2 = 0.0
+            return
+        self.count += 1
+        delta = value - self.mean
+        increment = self.decay * delta
+        self.mean += increment
+        # _m2 holds the variance directly in decayed mode
+        self._m2 = (1.0 - self.decay) * (self._m2 + delta * increment)
+
+    def _update_windowed(self, value: float):
+        self._values.append(value)
+        if len(self._values) <= self.window:
+            self._update_cumulative(value)
+            return
+        oldest = self._values.popleft()
+        old_mean = self.mean
+        self.mean += (value - oldest) / self.count
+        self._m2 += (value - oldest) * (value - self.mean + oldest - old_mean)
+        self._m2 = max(self._m2, 0.0)
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the tracked values."""
+        if self.count == 0:
+            return 0.0
+        if self.decay is not None:
+            return self._m2
+        return self._m2 / self.count
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation of the tracked values."""
+        return math.sqrt(self.variance)
+
+
+class RunningLinearRegression:
+    """Ordinary least squares maintained from running sufficient statistics.
+
+    Keeps the count, feature/target means and the centred co-moment matrices
+    (the numerically stable form of n, sum(x), sum(y), sum(x^2) and sum(xy)),
+    so adding or removing an observation costs O(d^2) regardless of history
+    size and the fitted coefficients match a batch refit on the same data.
+    """
+
+    def __init__(self, n_features: int = 1):
+        self.n_features = n_features
+        self.count = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.c_xx = np.zeros((n_features, n_features))
+        self.c_xy = np.zeros(n_features)
+
+    @classmethod
+    def from_groups(
+        cls, X, y_sums, counts, n_features: int = 1
+    ) -> "RunningLinearRegression":
+        """Builds the statistics of observations grouped by identical ``x``.
+
+        Each row of ``X`` stands for ``counts`` observations whose targets
+        sum to ``y_sums``, so a per-day rollup gives the same coefficients
+        as a refit on the individual orders.
+        """
+        stats = cls(n_features)
+        X = np.asarray(X, dtype=float).reshape(-1, n_features)
+        counts = np.asarray(counts, dtype=float).reshape(-1)
+        y_sums = np.asarray(y_sums, dtype=float).reshape(-1)
+        total = counts.sum()
+        if total == 0:
+            return stats
+        stats.count = int(total)
+        stats.mean_x = counts @ X / total
+        stats.mean_y = float(y_sums.sum() / total)
+        Xc = X - stats.mean_x
+        stats.c_xx = (Xc * counts[:, None]).T @ Xc
+        stats.c_xy = Xc.T @ (y_sums - counts * stats.mean_y)
+        return stats
+
+    def update(self, x, y: float):
+        """Adds a single observation."""
+        x = np.asarray(x, dtype=float).reshape(self.n_features)
+        y = float(y)
+        self.count += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x = self.mean_x + dx / self.count
+        self.mean_y += dy / self.count
+        self.c_xx += np.outer(dx, x - self.mean_x)
+        self.c_xy += dx * (y - self.mean_y)
+
+    def remove(self, x, y: float):
+        """Removes a previously added observation."""
+        if self.count == 0:
+            raise ValueError("No observations to remove")
+        x = np.asarray(x, dtype=float).reshape(self.n_features)
+        y = float(y)
+        if self.count == 1:
+            self.__init__(self.n_features)
+            return
+        mean_x = (self.count * self.mean_x - x) / (self.count - 1)
+        mean_y = (self.count * self.mean_y - y) / (self.count - 1)
+        self.c_xx -= np.outer(x - mean_x, x - self.mean_x)
+        self.c_xy -= (x - mean_x) * (y - self.mean_y)
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.count -= 1
+
+    def update_batch(self, X, y):
+        """Adds many observations, merging their statistics in one vectorized pass."""
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)
+        y = np.asarray(y, dtype=float).reshape(-1)
+        if y.size == 0:
+            return
+        batch_count = y.size
+        batch_mean_x = X.mean(axis=0)
+        batch_mean_y = float(y.mean())
+        Xc = X - batch_mean_x
+        yc = y - batch_mean_y
+        total = self.count + batch_count
+        weight = self.count * batch_count / total
+        delta_x = batch_mean_x - self.mean_x
+        delta_y = batch_mean_y - self.mean_y
+        self.c_xx += Xc.T @ Xc + np.outer(delta_x, delta_x) * weight
+        self.c_xy += Xc.T @ yc + delta_x * delta_y * weight
+        self.mean_x = self.mean_x + delta_x * batch_count / total
+        self.mean_y += delta_y * batch_count / total
+        self.count = total
+
+    def coefficients(self):
+        """Returns the fitted (coef, intercept)."""
+        if self.count < 2:
+            raise ValueError("At least two observations are required")
+        coef = np.linalg.lstsq(self.c_xx, self.c_xy, rcond=None)[0]
+        intercept = self.mean_y - float(self.mean_x @ coef)
+        return coef, intercept
+
+    def contributions(self, X):
+        """Returns (base_value, per-feature contributions) for the rows of ``X``.
+
+        For a linear model the exact Shapley values against the training
+        mean are ``coef * (x - mean_x)``, so ``base_value`` (the mean target)
+        plus a row's contributions equals its prediction.
+        """
+        coef, _ = self.coefficients()
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)
+        return self.mean_y, (X - self.mean_x) * coef